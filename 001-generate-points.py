@@ -2,10 +2,9 @@ import numpy as np
 import math
 import matplotlib.pyplot as plt
 plt.rcParams['figure.figsize'] = [5, 7]
-import os
 from subprocess import call, check_call, check_output
 from scipy.spatial import distance_matrix
-import json
+from helpersInstances import instanceStore
 
 class Drawer:
     def __init__(self, n):
@@ -137,22 +136,13 @@ for points in pointsToGenerate:
             print('passo')
             continue
 
-        if not os.path.exists('./points/{}'.format(correctPoints)):
-            os.mkdir('./points/{}'.format(correctPoints))
-
         # compute distance matrix
         dist = distance_matrix(uniquenr, uniquenr)
 
-        # save OPL data file
-        if not os.path.exists('./points/{}'.format(correctPoints)):
-            os.mkdir('./points/{}'.format(correctPoints))
-        with open('./points/{}/{}.dat'.format(correctPoints,it), 'w') as datFile:
-            datFile.write('totalHoles = {};\n'.format(len(xTot)))
-            datFile.write('zeroHoleID = {};\n'.format(np.random.randint(0, len(xTot))+1))
-            datFile.write('C = {};'.format(json.dumps(dist.tolist())))
-            # store numpy format files
-            np.savez('./points/{}/{}'.format(correctPoints,it), dist=dist, xTot=xTot, yTot=yTot)
-
-            if it == samplesNr:
-                finished = True
-            it += 1
\ No newline at end of file
+        # save coordinates, distance matrix and OPL metadata to the instance store
+        # (the OPL data file is written from the store when needed, see InstanceStore.writeDat)
+        instanceStore.add(correctPoints, it, xTot, yTot, dist, np.random.randint(0, len(xTot))+1)
+
+        if it == samplesNr:
+            finished = True
+        it += 1
@@ -1,61 +1,41 @@
-from os import walk, listdir
-import re
-from subprocess import call, check_call, check_output
+import os
 import json
-import numpy as np
-import matplotlib.pyplot as plt
-import sys
-from config import TIME_LIMITS
-
-optimResults = {}
-
-# for detailed comments on the loops, check 001-optimize.py
-for (dirpath, dirnames, filenames) in walk('./points/'):
-    points = [d for d in dirnames if not d.startswith('.ipynb')]
-    break
-
-#points = [10]
-for p in points:
-    folder = './points/{}/'.format(p)
-    files = [file for file in listdir(folder) if file.endswith('.dat')]
-    for i in range(int(len(files))):
-        distrId = i+1
-        for timeLimit in sorted(TIME_LIMITS, reverse=True):
-            # read file with raw solution
-            try:
-                with open('./points/{}/{}_{}_output.txt'.format(p,distrId,timeLimit), "r") as fin:
-                    rawOutput = fin.read()
-            except FileNotFoundError:
-                continue
-            
-            # RETRIEVE DATA
-            # retrieve solving time [mS]
-            runningTime = re.search('solving time ~= (.*).', rawOutput)
-            runningTime = round(float(runningTime.group(1)),1)
-            # retrieve obj function value
-            objFunValue = float(re.search(r'with objective (.*)', rawOutput).group(1))
-            # retrieve solution type
-            isOptimal = False
-            solutionType = re.search(r'\/\/ solution \((.*)\)', rawOutput).group(1)
-            if solutionType in ['optimal', 'integer optimal, tolerance']:
-                isOptimal = True
-                optimalFunValue = objFunValue
-            # compute distance from optimal solution
-            deltaFromOpt = (objFunValue/optimalFunValue-1)*100
-
-            #print(deltaFromOpt, optimalFunValue, objFunValue)
-
-            # store results of current run
-            optimResults.setdefault(p,{})
-            optimResults[p].setdefault(distrId,{})
-            optimResults[p][distrId][timeLimit] = {
-                'runningTime[ms]': runningTime,
-                'deltaFromOpt[%]': deltaFromOpt,
-                'objFunValue': objFunValue
-            }
-
-# store dictonary to file for later analysis
-with open("results.json", "wt") as fout:
-    json.dump(optimResults, fout)
-
-print('Results stored in results.json file')
\ No newline at end of file
+from helpersResults import updateIndex, optimalReference, buildResults, resultsTableRows, writeResultsTable
+
+# Extracts the results of the OPL runs (see 002-optimize.py) into results.json. Output files already parsed by a
+# previous run are skipped unless they changed (see helpersResults.py).
+# The results of all the solvers are also collected in the flat table results_table.csv, one row per
+# (solver, points, distribution, time limit), e.g. for 008-analysis.ipynb
+
+# results files of the other solvers with the format of results.json, included in the results table if present
+SOLVER_RESULTS = {
+    'genetic': 'results_genetic.json',
+    'decomposition': 'results_decomposition.json',
+    'exact': 'results_exact.json'
+}
+
+if __name__ == '__main__':
+    index = updateIndex('./points/', 'results_index.json')
+
+    solverResults = {}
+    for solver, path in SOLVER_RESULTS.items():
+        if os.path.exists(path):
+            with open(path) as json_data:
+                solverResults[solver] = json.load(json_data)
+    reference = optimalReference(index, solverResults.get('exact'))
+
+    optimResults = buildResults(index, reference)
+    missing = sorted({(p, i) for p in optimResults for i in optimResults[p]} - set(reference))
+    if missing:
+        print('No optimal solution found for (points, distribution): {}'.format(missing))
+
+    # store dictonary to file for later analysis
+    with open("results.json", "wt") as fout:
+        json.dump(optimResults, fout)
+
+    rows = resultsTableRows(optimResults, 'opl', reference)
+    for solver, results in solverResults.items():
+        rows += resultsTableRows(results, solver, reference)
+    writeResultsTable(rows, 'results_table.csv')
+
+    print('Results stored in results.json and results_table.csv files')
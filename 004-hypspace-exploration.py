@@ -1,14 +1,17 @@
-import h5py
 import numpy as np
-import telegram_send
-from hyperopt import fmin, tpe, hp, STATUS_OK, Trials
+from hyperopt import hp, STATUS_OK
 import json
 import time
-from genetic_model import geneticModel
-from os import walk, listdir
+from genetic_model import processSession
+from helpersHyperopt import parallelFmin, SQLiteTrialStore, notify
+from helpersTuning import customLoss
+from helpersInstances import loadInstance, listInstances
 from config import EXPLORATION_SPACE
 import sys
 
+# Usage: python 004-hypspace-exploration.py [nr of workers]
+# The trials are stored in TRIALS_DB, running the script again resumes the exploration where it was stopped
+
 # parameter space
 space = {
     'populationSize': hp.choice('populationSize', EXPLORATION_SPACE['populationSize']),
@@ -19,40 +22,31 @@ space = {
 }
 
 # look for all the folders with points distributions
-for (dirpath, dirnames, filenames) in walk('./points/'):
-    points = [int(d) for d in dirnames if not d.startswith('.ipynb')]
-    break
-files = [int(file.replace('.dat','')) for file in listdir('./points/{}/'.format(points[0])) if file.endswith('.dat')]
+instances = listInstances('./points/')
+points = list(instances.keys())
+files = instances[points[0]]
 # load optimal solutions found with OPL
 with open('results.json') as json_data:
     res = json.load(json_data)
 
-currentEval = 0
 maxEvaluations = 2500
+TRIALS_DB = 'results-space.sqlite'
 # send telegram notifications every 1/20 progress
 notificationSteps = np.round(np.quantile(np.arange(maxEvaluations), np.linspace(0,1,20)))
 
-stepPoints = []
-stepDistr = []
-
-# model definition
+# model definition, evaluated in the worker processes
 def create_model(space):
-    global currentEval
-    global maxEvaluations
-    
     # load distance matrix at random
     p = int(np.random.choice(points, size=1)[0])
     i = int(np.random.choice(files, size=1)[0])
-    print('Loading file ./points/{}/{}.npz'.format(p,i))
-    npzfile = np.load('./points/{}/{}.npz'.format(p,i))
-    distanceMatrix = npzfile['dist']
+    print('Loading point distribution {} of points/{}'.format(i,p))
+    # instances are cached in memory by each worker process
+    instance = loadInstance(p, i)
 
     # load model and optimize
     startTime = time.time()
 
     modelConfig = {
-        'timeLimit': 9999,
-        'distanceMatrix': distanceMatrix,
         'individualSize': p,
         'populationSize': space['populationSize'],
         'crossoverPB': space['crossoverPB'],
@@ -60,46 +54,47 @@ def create_model(space):
         'nrGenerations': space['nrGenerations'],
         'notImprovingLimit': space['notImprovingLimit']
     }
-    pop, logb, hof, _ = geneticModel(**modelConfig)
+    # the solver session is set up once per worker process and kept across the trials
+    pop, logb, hof, _ = processSession().solve(instance, modelConfig, timeLimit=9999)
     geneticTime = (time.time()-startTime)*1000
-    fitness = round(hof.keys[0].values[0], 13) # round to 13 for comparability with OPL
-    # load optimal obj function value for current point distribution
+    # load optimal solution for current point distribution and build custom loss function (see helpersTuning.py)
     OPLsolution = res[str(p)][str(i)]['9999']
-    optimalFunValue = OPLsolution['objFunValue']
-    deltaFromOpt = (1-(optimalFunValue/fitness))
-    OPLtime = OPLsolution['runningTime[ms]']
-    # build custom loss function
-    customLoss = 1.2*deltaFromOpt + geneticTime/OPLtime
-    #print('custom loss is', customLoss)
+    loss = customLoss(hof.keys[0].values[0], geneticTime, OPLsolution)
+    #print('custom loss is', loss)
 
-    print('Loss of evaluation #{}/{}: {}'.format(currentEval+1, maxEvaluations, customLoss))
-    print()
-    
-    # notify via telegram
-    if currentEval in notificationSteps:
-        telegram_send.send(['Hyperparameter space exploration reached {} of {} evaluations'.format(currentEval, maxEvaluations)])
-    
-    stepPoints.append(p)
-    stepDistr.append(i)
+    # the point distribution is returned with the loss, so it can be stored with the trial
+    return {'loss': loss, 'status': STATUS_OK, 'point': p, 'distr': i}
 
-    currentEval += 1
-    return {'loss': customLoss, 'status': STATUS_OK}
+if __name__ == '__main__':
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    stored = SQLiteTrialStore(TRIALS_DB).summary()
+    print('Trials already stored in {}: {}'.format(TRIALS_DB, stored))
+    currentEval = stored['done']+stored['errors']
 
-# start hyperparameter space exploration
-trials = Trials()
-best = fmin(create_model, space, algo=tpe.suggest, max_evals=maxEvaluations, trials=trials)
+    # called in the main process every time an evaluation is completed
+    def onResult(doc):
+        global currentEval
+        print('Loss of evaluation #{}/{}: {}'.format(doc['tid']+1, maxEvaluations, doc['result'].get('loss')))
+        print()
+        # notify via telegram (if available)
+        if currentEval in notificationSteps:
+            notify('Hyperparameter space exploration reached {} of {} evaluations'.format(currentEval, maxEvaluations))
+        currentEval += 1
 
-# store results
-results = {
-    'best': best,
-    'trials': trials.trials,
-    'results': trials.results,
-    'best_trial': trials.best_trial,
-    'stepPoints': stepPoints,
-    'stepDistr': stepDistr
-}
-with open('results-space.json', 'w') as fp:
-    json.dump(results, fp, default=str)
+    # start hyperparameter space exploration
+    trials = parallelFmin(create_model, space, maxEvaluations, TRIALS_DB, workers=workers, onResult=onResult)
+
+    # store results
+    results = {
+        'best': trials.argmin,
+        'trials': trials.trials,
+        'results': trials.results,
+        'best_trial': trials.best_trial,
+        'stepPoints': [result.get('point') for result in trials.results],
+        'stepDistr': [result.get('distr') for result in trials.results]
+    }
+    with open('results-space.json', 'w') as fp:
+        json.dump(results, fp, default=str)
 
-# send finish notification
-telegram_send.send(['Hyperparameter search finished'])
\ No newline at end of file
+    # send finish notification
+    notify('Hyperparameter search finished')
@@ -0,0 +1,56 @@
+import json
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import TIME_LIMITS, GENETIC_MODEL_CONFIG, SEED_FRACTION
+from helpersInstances import listInstances
+from helpersSweep import reseedWorker, jobKey, runSweepJob, appendCheckpoint, loadCheckpoint, mergeResults
+
+# Headless, parallel and resumable version of 006-optimize-genetic.py.
+# Every (points folder, point distribution, time limit) is an independent job run on a process pool.
+# Each finished job is appended to the checkpoint log, so a restarted sweep only runs the missing jobs.
+# Solves start from scratch, with --warm they are warm started from the solution cache (see helpersSolutionCache.py).
+# With --seed part of the initial population is built with construction heuristics (see helpersSeeding.py).
+# Usage: python 009-optimize-genetic-parallel.py [nr of workers] [--warm] [--seed]
+
+CHECKPOINT_FILE = 'results_genetic.log.jsonl'
+
+if __name__ == '__main__':
+    warm = '--warm' in sys.argv
+    seedFraction = SEED_FRACTION if '--seed' in sys.argv else 0.0
+    args = [arg for arg in sys.argv[1:] if arg not in ['--warm', '--seed']]
+    workers = int(args[0]) if len(args) > 0 else multiprocessing.cpu_count()
+    modelConfig = dict(GENETIC_MODEL_CONFIG, warmStart=warm, seedFraction=seedFraction)
+
+    with open('results.json') as json_data:
+        res = json.load(json_data)
+
+    instances = listInstances('./points/')
+    print('Found the following folders:', list(instances.keys()))
+    done = loadCheckpoint(CHECKPOINT_FILE)
+
+    jobs = []
+    for p, distributions in instances.items():
+        for i in distributions:
+            for timeLimit in TIME_LIMITS:
+                if jobKey(p, i, timeLimit) in done:
+                    continue
+                optimalFunValue = res[str(p)][str(i)]['9999']['objFunValue']
+                jobs.append((p, i, timeLimit, optimalFunValue, dict(modelConfig), './points/'))
+    # longest jobs first (9999 means no time limit), so that the short ones fill the gaps at the end of the sweep
+    jobs.sort(key=lambda job: (job[2], job[0]), reverse=True)
+    print('{} jobs already completed, {} jobs to run on {} workers'.format(len(done), len(jobs), workers))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=reseedWorker) as executor:
+        futures = [executor.submit(runSweepJob, job) for job in jobs]
+        for nr, future in enumerate(as_completed(futures)):
+            key, result = future.result()
+            appendCheckpoint(CHECKPOINT_FILE, key, result)
+            done[key] = result
+            print('Completed job {}/{}: points/{}/{}.dat with time limit {}s'.format(nr+1, len(jobs), *key))
+
+    # store dictonary with the results of all the completed jobs, same format of 006-optimize-genetic.py
+    with open("results_genetic.json", "wt") as fout:
+        json.dump(mergeResults(done), fout)
+
+    print('Optimization process finished')
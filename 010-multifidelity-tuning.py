@@ -0,0 +1,68 @@
+import json
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from config import EXPLORATION_SPACE, GENETIC_MODEL_CONFIG
+from helpersInstances import listInstances
+from helpersSweep import reseedWorker
+from helpersTuning import sampleConfiguration, budgetInstances, evaluateConfiguration, evaluateConfigurationJob, hyperband
+
+# Multi-fidelity alternative to 004-hypspace-exploration.py: Hyperband over the genetic algorithm parameters.
+# The budget of an evaluation is both the share of nrGenerations run and the number of instances (point
+# distributions) the configuration is evaluated on, the loss is the customLoss of 004 averaged on the instances.
+# At the end the best configuration is compared with the one used by 006-optimize-genetic.py on the full budget.
+# Usage: python 010-multifidelity-tuning.py [nr of workers]
+
+# maximum resource and reduction factor of Hyperband
+MAX_RESOURCE = 27
+ETA = 3
+# number of instances used with the full budget
+MAX_INSTANCES = 20
+SEED = 42
+
+if __name__ == '__main__':
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else multiprocessing.cpu_count()
+
+    # load optimal solutions found with OPL
+    with open('results.json') as json_data:
+        res = json.load(json_data)
+
+    rng = np.random.default_rng(SEED)
+    # fixed random order of the instances solved by OPL, each fidelity takes the first ones
+    instances = [(p, i) for p, distributions in listInstances('./points/').items() for i in distributions
+                 if str(i) in res.get(str(p), {})]
+    instances = [instances[k] for k in rng.permutation(len(instances))[:MAX_INSTANCES]]
+    spentGenerations = [0]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=reseedWorker) as executor:
+        # evaluate all the configurations of a rung in parallel
+        def evaluateMany(configs, resource):
+            selected = budgetInstances(instances, resource, MAX_RESOURCE)
+            outcomes = list(executor.map(evaluateConfigurationJob,
+                                         [(config, selected, resource/MAX_RESOURCE, res) for config in configs]))
+            spentGenerations[0] += sum(generations for _, generations in outcomes)
+            losses = [loss for loss, _ in outcomes]
+            print('  {} configurations on {} instances with resource {}, best loss {}'.format(
+                len(configs), len(selected), resource, min(losses)))
+            return losses
+
+        best, bestLoss, history = hyperband(MAX_RESOURCE, ETA, lambda: sampleConfiguration(EXPLORATION_SPACE, rng),
+                                            evaluateMany)
+
+    # configuration found via 004-hypspace-exploration.py, evaluated with the full budget for comparison
+    referenceLoss, referenceGenerations = evaluateConfiguration(GENETIC_MODEL_CONFIG, instances, 1, res)
+    print('Best configuration: {} with loss {}'.format(best, bestLoss))
+    print('Configuration of 006-optimize-genetic.py: {} with loss {}'.format(GENETIC_MODEL_CONFIG, referenceLoss))
+    print('Generations run during the tuning: {}'.format(spentGenerations[0]))
+
+    results = {
+        'best': best,
+        'bestLoss': bestLoss,
+        'reference': {'config': GENETIC_MODEL_CONFIG, 'loss': referenceLoss},
+        'spentGenerations': spentGenerations[0],
+        'instances': instances,
+        'history': history
+    }
+    with open('results-multifidelity.json', 'w') as fp:
+        json.dump(results, fp, default=str)
@@ -0,0 +1,29 @@
+import os
+import sys
+import numpy as np
+from helpersInstances import InstanceStore, listInstanceFiles, readZeroHoleID
+
+# Build the instance store (./instances/) from the point distributions saved in the points folders by older
+# versions of 001-generate-points.py: coordinates and distance matrix are read from the .npz files and the
+# zeroHoleID from the OPL .dat files. Instances already in the store are skipped, so the script can be run again.
+# Usage: python 011-build-instance-store.py [points folder] [store folder]
+
+if __name__ == '__main__':
+    pointsDir = sys.argv[1] if len(sys.argv) > 1 else './points/'
+    storeDir = sys.argv[2] if len(sys.argv) > 2 else './instances/'
+    store = InstanceStore(storeDir)
+    instances = listInstanceFiles(pointsDir)
+
+    added = 0
+    for p, distributions in instances.items():
+        for i in distributions:
+            if (p, i) in store:
+                continue
+            with np.load(os.path.join(pointsDir, str(p), '{}.npz'.format(i))) as npzfile:
+                dist, xTot, yTot = npzfile['dist'], npzfile['xTot'], npzfile['yTot']
+            zeroHoleID = readZeroHoleID(os.path.join(pointsDir, str(p), '{}.dat'.format(i)))
+            store.add(p, i, xTot, yTot, dist, zeroHoleID)
+            added += 1
+            print('Added points/{}/{} to the instance store'.format(p, i))
+
+    print('{} instances added, {} instances in {}'.format(added, len(store.index['instances']), storeDir))
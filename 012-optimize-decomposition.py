@@ -0,0 +1,42 @@
+import json
+import sys
+from config import TIME_LIMITS, GENETIC_MODEL_CONFIG
+from helpersInstances import listInstances
+from helpersSweep import jobKey, runGeneticJob, appendCheckpoint, loadCheckpoint, mergeResults
+
+# Same optimization of 006-optimize-genetic.py with the decomposition model (see decomposition_model.py):
+# the clusters of every instance are solved in parallel, so the jobs are run one at a time.
+# Each finished job is appended to the checkpoint log, so a restarted sweep only runs the missing jobs.
+# Usage: python 012-optimize-decomposition.py [nr of workers] [cluster size]
+
+CHECKPOINT_FILE = 'results_decomposition.log.jsonl'
+
+if __name__ == '__main__':
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    clusterSize = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    with open('results.json') as json_data:
+        res = json.load(json_data)
+
+    instances = listInstances('./points/')
+    print('Found the following folders:', list(instances.keys()))
+    done = loadCheckpoint(CHECKPOINT_FILE)
+    modelConfig = dict(GENETIC_MODEL_CONFIG, workers=workers, clusterSize=clusterSize)
+
+    for p, distributions in instances.items():
+        for i in distributions:
+            for timeLimit in TIME_LIMITS:
+                key = jobKey(p, i, timeLimit)
+                if key in done:
+                    continue
+                print('Running optimization for points/{}/{}.dat with time limit {}s'.format(p, i, timeLimit))
+                optimalFunValue = res[str(p)][str(i)]['9999']['objFunValue']
+                result = runGeneticJob(p, i, timeLimit, optimalFunValue, modelConfig, model='decomposition')
+                appendCheckpoint(CHECKPOINT_FILE, key, result)
+                done[key] = result
+
+    # store dictonary with the results of all the completed jobs, same format of results_genetic.json
+    with open("results_decomposition.json", "wt") as fout:
+        json.dump(mergeResults(done), fout)
+
+    print('Optimization process finished')
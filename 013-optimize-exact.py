@@ -0,0 +1,58 @@
+import json
+import sys
+from config import TIME_LIMITS
+from helpersInstances import listInstances, loadInstance, loadZeroHoleID
+from exact_model import exactModel, HELD_KARP_MAX_SIZE
+from helpersSolutions import solutionStore
+
+# Same optimization of 002-optimize.py and 003-extract-results.py with the MILP solver of scipy instead of OPL
+# (see exact_model.py), results are stored with the same format of results.json.
+# Small instances are solved with Held-Karp dynamic programming, the others with the DFJ formulation (formulation auto).
+# Passing results.json as output file regenerates the optimal values used by 004 and 006 without OPL.
+# Usage: python 013-optimize-exact.py [formulation: auto, heldkarp, dfj or flow] [output file]
+
+if __name__ == '__main__':
+    formulation = sys.argv[1] if len(sys.argv) > 1 else 'auto'
+    outputFile = sys.argv[2] if len(sys.argv) > 2 else 'results_exact.json'
+
+    optimResults = {}
+    unsolvables = {}
+    instances = listInstances('./points/')
+    print('Found the following folders:', list(instances.keys()))
+    if formulation == 'heldkarp' and max(instances, default=0) > HELD_KARP_MAX_SIZE:
+        sys.exit('Held-Karp is limited to {} points, use the auto formulation'.format(HELD_KARP_MAX_SIZE))
+
+    for p, distributions in instances.items():
+        for i in distributions:
+            instance = loadInstance(p, i)
+            zeroHoleID = loadZeroHoleID(p, i)
+            # without time limit first, the optimal value is needed to compute the distance from the optimum
+            optimalFunValue = None
+            for timeLimit in sorted(TIME_LIMITS, reverse=True):
+                print('Running optimization for points/{}/{}.dat with time limit {}s'.format(p, i, timeLimit))
+                result = exactModel(instance['dist'], zeroHoleID, timeLimit, formulation)
+                if result is None:
+                    unsolvables.setdefault(p, {})
+                    unsolvables[p].setdefault(timeLimit, [])
+                    unsolvables[p][timeLimit].append(i)
+                    print('  × Current problem is unsolvable')
+                    continue
+                if result['status'] == 'optimal':
+                    optimalFunValue = result['objFunValue']
+                solutionStore.add(p, i, timeLimit, 'exact', result['tour'])
+                optimResults.setdefault(p, {})
+                optimResults[p].setdefault(i, {})
+                optimResults[p][i][timeLimit] = {
+                    'runningTime[ms]': result['runningTime[ms]'],
+                    'deltaFromOpt[%]': None if optimalFunValue is None else (result['objFunValue']/optimalFunValue-1)*100,
+                    'objFunValue': result['objFunValue'],
+                    'status': result['status']
+                }
+
+    # store dictonaries with the results and the unsolved problems to file for later analysis
+    with open(outputFile, "wt") as fout:
+        json.dump(optimResults, fout)
+    with open("unsolvables_exact.json", "wt") as fout:
+        json.dump(unsolvables, fout)
+
+    print('Results stored in {} file'.format(outputFile))
@@ -0,0 +1,47 @@
+import os
+import re
+import sys
+import numpy as np
+from helpersInstances import listInstances, loadZeroHoleID
+from helpersSolutions import SolutionStore, readFlowMatrix, flowToTour, rotateTour
+
+# Build the solution store (solutions.bin, see helpersSolutions.py) from the solutions saved in the points folders
+# by older versions of the scripts: OPL flow matrices ({i}_{timeLimit}_sol.txt) and tours of the genetic and
+# decomposition models ({i}_{timeLimit}_gen_sol.npz and {i}_{timeLimit}_dec_sol.npz).
+# Solutions already in the store are skipped, so the script can be run again. With --remove the converted files
+# are deleted from the points folders.
+# Usage: python 014-build-solution-store.py [--remove] [points folder] [store file]
+
+SOLUTION_FILE = re.compile(r'^(\d+)_([\d.]+)_(gen_|dec_)?sol\.(txt|npz)$')
+SOLVERS = {None: 'opl', 'gen_': 'genetic', 'dec_': 'decomposition'}
+
+if __name__ == '__main__':
+    remove = '--remove' in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != '--remove']
+    pointsDir = args[0] if len(args) > 0 else './points/'
+    store = SolutionStore(args[1] if len(args) > 1 else './solutions.bin')
+
+    added, removed = 0, 0
+    for p in listInstances(pointsDir):
+        folder = os.path.join(pointsDir, str(p))
+        for file in sorted(os.listdir(folder)):
+            match = SOLUTION_FILE.match(file)
+            if match is None:
+                continue
+            i, timeLimit, solver = int(match.group(1)), match.group(2), SOLVERS[match.group(3)]
+            path = os.path.join(folder, file)
+            if (p, i, timeLimit, solver) not in store:
+                zeroHoleID = loadZeroHoleID(p, i, pointsDir)
+                if solver == 'opl':
+                    tour = flowToTour(readFlowMatrix(path), zeroHoleID)
+                else:
+                    with np.load(path) as npzfile:
+                        tour = rotateTour(npzfile['sol'], zeroHoleID)
+                store.add(p, i, timeLimit, solver, tour)
+                added += 1
+            if remove:
+                os.remove(path)
+                removed += 1
+
+    print('{} solutions added, {} files removed, {} solutions in {}'.format(added, removed, len(store.keys()),
+                                                                           store.path))
@@ -0,0 +1,39 @@
+import os
+import sys
+from helpersBenchmark import benchmarkInstances, runBenchmarks, saveBaseline, loadBaseline, compareResults, \
+    SYNTHETIC_SIZES
+
+# Benchmarks of the genetic algorithm operators and of complete geneticModel solves (see helpersBenchmark.py),
+# on the instances of the points folders and on synthetic instances up to 3000 points.
+# run stores the results in the baseline file. compare runs the benchmarks again and lists the metrics that got
+# worse than the baseline by more than the threshold (percentage), exiting with an error if any is found.
+# --quick skips the synthetic instances.
+# Usage: python 015-benchmark.py [run|compare] [baseline file] [threshold %] [--quick]
+
+if __name__ == '__main__':
+    quick = '--quick' in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != '--quick']
+    mode = args[0] if len(args) > 0 else 'run'
+    baselineFile = args[1] if len(args) > 1 else 'benchmark_baseline.json'
+    threshold = float(args[2])/100 if len(args) > 2 else 0.1
+    if mode not in ['run', 'compare']:
+        sys.exit('Unknown mode {}, use run or compare'.format(mode))
+    if mode == 'compare' and not os.path.exists(baselineFile):
+        sys.exit('Baseline file {} not found, create it with: python 015-benchmark.py run'.format(baselineFile))
+
+    instances = benchmarkInstances(synthetic=[] if quick else SYNTHETIC_SIZES)
+    current = runBenchmarks(instances)
+
+    if mode == 'run':
+        saveBaseline(current, baselineFile)
+        print('Baseline stored in {}'.format(baselineFile))
+    else:
+        comparisons, regressions = compareResults(loadBaseline(baselineFile), current, threshold)
+        for name, metric, reference, value, change in comparisons:
+            print('{:<45} {:<25} {:>12.3f} -> {:>12.3f} ({:+.1f}%)'.format(name, metric, reference, value, change*100))
+        if regressions:
+            print('{} regressions above {:.0f}%:'.format(len(regressions), threshold*100))
+            for name, metric, reference, value, change in regressions:
+                print('  × {} {}: {:.3f} -> {:.3f} ({:+.1f}%)'.format(name, metric, reference, value, change*100))
+            sys.exit(1)
+        print('No regressions above {:.0f}%'.format(threshold*100))
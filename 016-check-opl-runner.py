@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+# Check of the OPL runner (helpersOpl.py) without OPL: opl-model/fake-oplrun.py is used as oplrun, unless the
+# OPLRUN environment variable already points to another binary. Two solves run at the same time on copies of the
+# instances of points/10, the check verifies that they overlap, that each one reads its own export.txt (no
+# unsolvable records, one tour per solve in the solution store, output files parsed by helpersResults.py) and that
+# malformed outputs and failed solves become unsolvable records instead of stopping the batch.
+# Usage: python 016-check-opl-runner.py
+FAKE_OPLRUN = os.path.abspath('./opl-model/fake-oplrun.py')
+os.environ.setdefault('OPLRUN', FAKE_OPLRUN)
+os.environ['FAKE_OPLRUN_DELAY'] = '1'
+
+from config import OPL_BINARY, OPL_MODEL
+from helpersOpl import runOplBatch
+from helpersResults import parseOplOutput
+from helpersSolutions import SolutionStore
+from helpersGeneticAlgo import evalTSP
+from helpersInstances import loadInstance
+
+def check(condition, message):
+    print('{} {}'.format('  ✓' if condition else '  ×', message))
+    return condition
+
+if __name__ == '__main__':
+    print('Checking the OPL runner with {}'.format(OPL_BINARY))
+    sharedExport = os.path.join(os.path.dirname(OPL_MODEL), 'export.txt')
+    sharedExportTime = os.stat(sharedExport).st_mtime_ns if os.path.exists(sharedExport) else None
+    workDir = tempfile.mkdtemp(prefix='opl-check-')
+    passed = True
+    try:
+        pointsDir = os.path.join(workDir, 'points')
+        os.makedirs(os.path.join(pointsDir, '10'))
+        for i in [1, 2]:
+            for extension in ['dat', 'npz']:
+                shutil.copy('./points/10/{}.{}'.format(i, extension), os.path.join(pointsDir, '10'))
+        store = SolutionStore(os.path.join(workDir, 'solutions.bin'))
+        jobs = [(10, 1, 0.1), (10, 2, 0.1)]
+
+        # concurrent solves
+        os.environ['FAKE_OPLRUN_MODE'] = 'ok'
+        start = time.perf_counter()
+        records = runOplBatch(jobs, workers=2, pointsDir=pointsDir, solutions=store)
+        elapsed = time.perf_counter()-start
+        passed &= check(records == [], 'no unsolvable records: {}'.format(records))
+        passed &= check(elapsed < 1.8, 'the two solves ran at the same time ({:.2f}s)'.format(elapsed))
+        for p, i, timeLimit in jobs:
+            tour = store.get(p, i, timeLimit, 'opl')
+            result = parseOplOutput(os.path.join(pointsDir, str(p), '{}_{}_output.txt'.format(i, timeLimit)))
+            passed &= check(tour is not None and sorted(tour) == list(range(p)),
+                            'tour of points/{}/{}.dat in the solution store'.format(p, i))
+            passed &= check(result is not None and tour is not None and
+                            abs(evalTSP(tour, loadInstance(p, i, pointsDir)['dist'])[0]-result['objFunValue']) < 1e-9,
+                            'output of points/{}/{}.dat parsed, objective equal to the tour length'.format(p, i))
+        passed &= check(sharedExportTime == (os.stat(sharedExport).st_mtime_ns if os.path.exists(sharedExport) else None),
+                        'the shared {} was not written'.format(sharedExport))
+
+        # failed solves become unsolvable records
+        for mode, reason in [('truncated', 'invalid output'), ('infeasible', 'no feasible solution')]:
+            os.environ['FAKE_OPLRUN_MODE'] = mode
+            records = runOplBatch(jobs, workers=2, pointsDir=pointsDir, solutions=store)
+            passed &= check(len(records) == len(jobs) and all(r['reason'].startswith(reason) for r in records),
+                            '{} solves recorded as {}'.format(mode, reason))
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+
+    if not passed:
+        sys.exit('OPL runner check failed')
+    print('OPL runner check passed')
@@ -1,3 +1,4 @@
+import os
 import numpy as np
 
 # range of time limits to test the algorithm with
@@ -11,4 +12,21 @@ EXPLORATION_SPACE = {
     'mutationPB': np.arange(0.1,0.65,0.05),
     'nrGenerations': np.arange(50,550,50),
     'notImprovingLimit': np.arange(5,35,5)
-}
\ No newline at end of file
+}
+
+# optimal model configuration found via 004-hypspace-exploration.py
+GENETIC_MODEL_CONFIG = {
+    'populationSize': 230,
+    'crossoverPB': 0.64,
+    'mutationPB': 0.33,
+    'nrGenerations': 308,
+    'notImprovingLimit': 16
+}
+# share of the initial population built with construction heuristics (see helpersSeeding.py),
+# used by 006-optimize-genetic.py and 009-optimize-genetic-parallel.py with --seed
+SEED_FRACTION = 0.1
+# OPL solver used by 002-optimize.py, the oplrun binary can be overridden with the OPLRUN environment variable
+OPL_BINARY = os.environ.get('OPLRUN', '/opt/ibm/ILOG/CPLEX_Studio128/opl/bin/x86-64_linux/oplrun')
+OPL_MODEL = './opl-model/hw1.mod'
+# seconds given to oplrun on top of the time limit before the process is killed
+OPL_WATCHDOG_MARGIN = 30
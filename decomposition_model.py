@@ -0,0 +1,144 @@
+import math
+import random
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.cluster.vq import kmeans2
+from scipy.spatial import distance_matrix as pointsDistanceMatrix
+from deap import tools
+from genetic_model import geneticModel
+from helpersGeneticAlgo import evalTSP, nearestNeighbors, localSearch, deadlineAfter, remainingTime
+from helpersArrayPopulation import ArrayPopulation, ArrayHallOfFame
+from helpersDistance import CoordinateDistance, scalarLookup
+
+###########################
+### DECOMPOSITION MODEL ###
+###########################
+# Cluster-first solver for large instances: the points are partitioned with k-means, every cluster is solved with
+# the genetic algorithm in a separate worker process, the clusters are visited in the order given by a tour of
+# their centroids and the sub-tours are joined at their best entry/exit points. A final 2-opt/Or-opt pass on the
+# whole tour repairs the edges around the joins.
+
+# share of the time limit given to the clusters and to the tour of the centroids, the rest goes to the repair
+CLUSTERS_TIME_SHARE = 0.6
+CENTROIDS_TIME_SHARE = 0.1
+
+# Partition the points in nrClusters groups with k-means, returns the ids of the points of every (non empty) cluster
+def clusterPoints(xTot, yTot, nrClusters, seed=None):
+    points = np.stack((xTot, yTot), axis=-1)
+    if nrClusters <= 1:
+        return [np.arange(len(points))]
+    _, labels = kmeans2(points, nrClusters, minit='++', seed=seed)
+    clusters = [np.flatnonzero(labels == c) for c in range(nrClusters)]
+    return [cluster for cluster in clusters if len(cluster) > 0]
+
+# Solve the tour of a set of points with the genetic algorithm, returns the tour (ids of the points), its length
+# and the logbook. Sets of 3 points or less have a single tour
+def solvePoints(xTot, yTot, timeLimit, modelConfig, seed=None):
+    size = len(xTot)
+    if size <= 3:
+        return list(range(size)), None, []
+    random.seed(seed)
+    np.random.seed(seed)
+    points = np.stack((xTot, yTot), axis=-1)
+    distanceMatrix = pointsDistanceMatrix(points, points)
+    pop, logb, hof, generationLog = geneticModel(timeLimit=timeLimit, distanceMatrix=distanceMatrix,
+                                                 individualSize=size, xTot=xTot, yTot=yTot, **modelConfig)
+    if generationLog is False or len(hof) == 0:
+        # no generation completed in the time limit, any tour is a valid tour
+        return list(range(size)), None, list(logb)
+    return list(hof.items[0]), hof.keys[0].values[0], list(logb)
+
+# Worker of the process pool: solves one cluster, returns its tour with the ids of the whole instance.
+# All the clusters share the same deadline, clusters waiting for a free worker get the remaining time
+def clusterWorker(args):
+    nodes, xTot, yTot, deadline, modelConfig, seed = args
+    timeLimit = remainingTime(deadline)
+    tour, fitness, records = solvePoints(xTot, yTot, timeLimit, modelConfig, seed)
+    return nodes[tour].tolist(), fitness, records
+
+def pointDistances(xTot, yTot, nodes, point):
+    dx = xTot[nodes]-point[0]
+    dy = yTot[nodes]-point[1]
+    return np.sqrt(dx*dx + dy*dy)
+
+# Join the sub-tours (cycles) of the clusters following the given order of the clusters.
+# Every cycle is opened removing one of its edges: the edge and the direction are chosen to minimize the distance
+# from the exit of the previous cluster to the entry point, minus the removed edge, plus the distance from the exit
+# point to the centroid of the next cluster
+def stitchSubTours(subTours, order, centroids, xTot, yTot):
+    tour = []
+    # the first cluster is entered from the last one, approximated by its centroid
+    previous = centroids[order[-1]]
+    for position, cluster in enumerate(order):
+        cycle = np.asarray(subTours[cluster])
+        if len(cycle) == 1:
+            tour.append(int(cycle[0]))
+            previous = (xTot[cycle[0]], yTot[cycle[0]])
+            continue
+        nextCentroid = centroids[order[(position+1) % len(order)]]
+        # edges (u[j], v[j]) of the cycle
+        u, v = cycle, np.roll(cycle, -1)
+        removed = np.sqrt((xTot[u]-xTot[v])**2 + (yTot[u]-yTot[v])**2)
+        # forward: enter in v[j], walk the cycle and exit from u[j]. Backward: enter in u[j] and exit from v[j]
+        forward = pointDistances(xTot, yTot, v, previous) - removed + pointDistances(xTot, yTot, u, nextCentroid)
+        backward = pointDistances(xTot, yTot, u, previous) - removed + pointDistances(xTot, yTot, v, nextCentroid)
+        j = int(np.argmin(np.minimum(forward, backward)))
+        path = np.roll(cycle, -(j+1))
+        if backward[j] < forward[j]:
+            path = path[::-1]
+        tour += path.tolist()
+        previous = (xTot[path[-1]], yTot[path[-1]])
+    return tour
+
+# Run the decomposition model, returns the same values of geneticModel: the final tour as population, the logbook
+# (records of every cluster, with an additional cluster field), the hall of fame and the generation log.
+# The distances of the instance are computed from the coordinates, unless distanceMatrix is given.
+# modelConfig contains the geneticModel parameters used for the clusters and for the tour of the centroids.
+def decompositionModel(timeLimit, xTot, yTot, distanceMatrix=None, clusterSize=100, nrClusters=None, workers=None,
+                       repairPasses=100, localSearchNeighbors=8, seed=None, **modelConfig):
+    startTime = time.perf_counter()
+    deadline = deadlineAfter(timeLimit, startTime)
+    xTot = np.asarray(xTot, dtype=np.float64)
+    yTot = np.asarray(yTot, dtype=np.float64)
+    individualSize = len(xTot)
+    nrClusters = nrClusters or int(math.ceil(individualSize/clusterSize))
+    workers = workers or multiprocessing.cpu_count()
+    seeds = np.random.SeedSequence(seed).generate_state(nrClusters+2)
+
+    # SOLVE THE CLUSTERS
+    clusters = clusterPoints(xTot, yTot, nrClusters, seed=int(seeds[-1]))
+    clustersDeadline = None if deadline is None else deadlineAfter(timeLimit*CLUSTERS_TIME_SHARE, startTime)
+    jobs = [(nodes, xTot[nodes], yTot[nodes], clustersDeadline, modelConfig, int(seeds[c]))
+            for c, nodes in enumerate(clusters)]
+    if len(jobs) == 1 or workers == 1:
+        results = [clusterWorker(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            results = list(executor.map(clusterWorker, jobs))
+    subTours = [subTour for subTour, _, _ in results]
+
+    # ORDER THE CLUSTERS AND JOIN THE SUB-TOURS
+    centroids = np.array([(xTot[nodes].mean(), yTot[nodes].mean()) for nodes in clusters])
+    centroidsTime = 9999 if deadline is None else remainingTime(deadline)*CENTROIDS_TIME_SHARE/(1-CLUSTERS_TIME_SHARE)
+    order, _, _ = solvePoints(centroids[:, 0], centroids[:, 1], centroidsTime, modelConfig, int(seeds[-2]))
+    tour = stitchSubTours(subTours, order, centroids, xTot, yTot)
+
+    # REPAIR THE WHOLE TOUR
+    distances = CoordinateDistance(xTot, yTot) if distanceMatrix is None else distanceMatrix
+    tour, _ = localSearch(tour, scalarLookup(distances), nearestNeighbors(distances, localSearchNeighbors),
+                          maxPasses=repairPasses, deadline=deadline)
+
+    logbook = tools.Logbook()
+    logbook.header = ['gen', 'cluster', 'nevals', 'avg', 'std', 'min', 'max']
+    for c, (_, _, records) in enumerate(results):
+        for record in records:
+            logbook.record(cluster=c, **record)
+    pop = ArrayPopulation(1, individualSize)
+    pop.tours[0] = tour
+    pop.fitness[0] = evalTSP(tour, distances)[0]
+    pop.valid[0] = True
+    hof = ArrayHallOfFame(1, individualSize)
+    hof.update(pop)
+    return pop, logbook, hof, []
@@ -0,0 +1,250 @@
+import time
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import milp, LinearConstraint, Bounds
+from helpersGeneticAlgo import deadlineAfter, pastDeadline, remainingTime
+
+# Exact solution of the TSP with the MILP solver of scipy (HiGHS), no OPL/CPLEX installation is needed.
+# Two formulations are available, on the binary variables y[i][j] (edge from i to j is in the tour):
+# - 'flow': same model of opl-model/hw1.mod, connectivity is imposed by a single commodity flow x[i][j]
+#   sent from the zero hole to all the other holes
+# - 'dfj': Dantzig-Fulkerson-Johnson, the model is solved with the degree constraints only and the subtours of the
+#   solution are cut away (sum of the edges inside a subtour S <= |S|-1), until the solution is a single tour.
+#   Usually much faster, only the violated subtour constraints are added to the model.
+# - 'heldkarp': Held-Karp dynamic programming, no MILP solver, for instances up to HELD_KARP_MAX_SIZE holes only
+#   (see heldKarpModel)
+# - 'auto': Held-Karp up to HELD_KARP_MAX_SIZE holes, DFJ for larger instances
+# Results have the same fields of results.json (see 003-extract-results.py) plus the solution status and the tour.
+
+# largest instance solved with Held-Karp, memory grows as 2^size
+HELD_KARP_MAX_SIZE = 20
+
+##########################
+### MODEL CONSTRAINTS ###
+##########################
+# Every hole has exactly one outgoing and one incoming edge
+def degreeConstraints(size):
+    outBound = sp.kron(sp.identity(size), np.ones((1, size)))
+    inBound = sp.kron(np.ones((1, size)), sp.identity(size))
+    return sp.vstack([outBound, inBound]).tocsr()
+
+# Edges between two holes can be used in one direction only (subtours of two holes)
+def twoCycleConstraints(size):
+    i, j = np.triu_indices(size, k=1)
+    rows = np.repeat(np.arange(len(i)), 2)
+    cols = np.stack((i*size+j, j*size+i), axis=-1).ravel()
+    return sp.csr_matrix((np.ones(len(cols)), (rows, cols)), shape=(len(i), size*size))
+
+# Sum of the edges inside every subtour <= size of the subtour - 1
+def subtourConstraints(subtours, size):
+    rows, cols = [], []
+    for row, subtour in enumerate(subtours):
+        subtour = np.asarray(subtour)
+        edges = (subtour[:, None]*size + subtour[None, :]).ravel()
+        rows.append(np.full(len(edges), row))
+        cols.append(edges)
+    matrix = sp.csr_matrix((np.ones(sum(len(c) for c in cols)), (np.concatenate(rows), np.concatenate(cols))),
+                           shape=(len(subtours), size*size))
+    return LinearConstraint(matrix, -np.inf, [len(subtour)-1 for subtour in subtours])
+
+# Cycles of the solution y, as lists of holes
+def solutionCycles(y, size):
+    successor = np.argmax(np.asarray(y[:size*size]).reshape(size, size), axis=1)
+    visited = np.zeros(size, dtype=bool)
+    cycles = []
+    for start in range(size):
+        if visited[start]:
+            continue
+        cycle = []
+        node = start
+        while not visited[node]:
+            visited[node] = True
+            cycle.append(int(node))
+            node = successor[node]
+        cycles.append(cycle)
+    return cycles
+
+# Join the cycles into a single tour (used when the time limit is reached before all the subtours are cut away):
+# the smallest cycle is merged with the cycle and the exchange of two edges that increase the length the least
+def mergeCycles(cycles, distanceMatrix):
+    cycles = [list(cycle) for cycle in cycles]
+    while len(cycles) > 1:
+        cycles.sort(key=len)
+        small = np.asarray(cycles[0])
+        smallNext = np.roll(small, -1)
+        best = None
+        for k, other in enumerate(cycles[1:], start=1):
+            other = np.asarray(other)
+            otherNext = np.roll(other, -1)
+            removed = distanceMatrix[small, smallNext][:, None] + distanceMatrix[other, otherNext][None, :]
+            # edges (a, b) of the small cycle and (c, d) of the other: add (a, d), (c, b) or (a, c), (d, b)
+            same = distanceMatrix[small[:, None], otherNext[None, :]] + distanceMatrix[other[None, :], smallNext[:, None]] - removed
+            opposite = distanceMatrix[small[:, None], other[None, :]] + distanceMatrix[otherNext[None, :], smallNext[:, None]] - removed
+            for costs, reverse in ((same, False), (opposite, True)):
+                a, c = np.unravel_index(np.argmin(costs), costs.shape)
+                if best is None or costs[a, c] < best[0]:
+                    best = (costs[a, c], k, a, c, reverse)
+        _, k, a, c, reverse = best
+        other = cycles[k]
+        # small cycle from b to a, other cycle from d to c (or from c to d when reversed)
+        smallPath = cycles[0][a+1:] + cycles[0][:a+1]
+        otherPath = other[c+1:] + other[:c+1]
+        if reverse:
+            otherPath = otherPath[::-1]
+        cycles[k] = smallPath + otherPath
+        cycles.pop(0)
+    return cycles[0]
+
+def tourLength(tour, distanceMatrix):
+    tour = np.asarray(tour)
+    return float(np.sum(distanceMatrix[tour, np.roll(tour, -1)]))
+
+####################
+### EXACT MODELS ###
+####################
+def milpOptions(deadline, mipGap):
+    options = {'disp': False, 'mip_rel_gap': mipGap}
+    if deadline is not None:
+        options['time_limit'] = remainingTime(deadline)
+    return options
+
+# Single commodity flow formulation of hw1.mod. Variables are y (binary) followed by x (flow), both size x size
+def flowModel(distanceMatrix, zeroHoleID, deadline, mipGap):
+    size = len(distanceMatrix)
+    zero = zeroHoleID-1
+    nrEdges = size*size
+    cost = np.concatenate((np.asarray(distanceMatrix, dtype=np.float64).ravel(), np.zeros(nrEdges)))
+    degree = degreeConstraints(size)
+    # totalFlow: the zero hole sends card(I) units of flow
+    totalFlow = sp.csr_matrix((np.ones(size), (np.zeros(size), nrEdges + zero*size + np.arange(size))),
+                              shape=(1, 2*nrEdges))
+    # netFlow: every other hole keeps one unit of flow (incoming flow - outgoing flow == 1)
+    netFlow = (degree[size:] - degree[:size])[[k for k in range(size) if k != zero]]
+    # flowUsage: flow only on the edges of the tour, x[i][j] <= y[i][j]*card(I)
+    flowUsage = sp.hstack([-size*sp.identity(nrEdges), sp.identity(nrEdges)])
+    constraints = [
+        LinearConstraint(sp.hstack([degree, sp.csr_matrix((2*size, nrEdges))]), 1, 1),
+        LinearConstraint(totalFlow, size, size),
+        LinearConstraint(sp.hstack([sp.csr_matrix((size-1, nrEdges)), netFlow]), 1, 1),
+        LinearConstraint(flowUsage, -np.inf, 0)
+    ]
+    # no edges from a hole to itself
+    upper = np.concatenate((1-np.identity(size).ravel(), np.full(nrEdges, size)))
+    integrality = np.concatenate((np.ones(nrEdges), np.zeros(nrEdges)))
+    result = milp(cost, constraints=constraints, integrality=integrality, bounds=Bounds(0, upper),
+                  options=milpOptions(deadline, mipGap))
+    if result.x is None:
+        return None, None, 0
+    return solutionCycles(np.round(result.x), size), result.status == 0, 1
+
+# DFJ formulation with iterative subtour cuts
+def dfjModel(distanceMatrix, deadline, mipGap):
+    size = len(distanceMatrix)
+    cost = np.asarray(distanceMatrix, dtype=np.float64).ravel()
+    constraints = [LinearConstraint(degreeConstraints(size), 1, 1)]
+    if size > 2:
+        constraints.append(LinearConstraint(twoCycleConstraints(size), -np.inf, 1))
+    bounds = Bounds(0, 1-np.identity(size).ravel())
+    cycles, iterations = None, 0
+    while True:
+        result = milp(cost, constraints=constraints, integrality=np.ones(size*size), bounds=bounds,
+                      options=milpOptions(deadline, mipGap))
+        iterations += 1
+        if result.x is None:
+            return cycles, False, iterations
+        cycles = solutionCycles(np.round(result.x), size)
+        if len(cycles) == 1 or result.status != 0:
+            return cycles, result.status == 0 and len(cycles) == 1, iterations
+        constraints.append(subtourConstraints(cycles, size))
+        if pastDeadline(deadline):
+            return cycles, False, iterations
+
+# Held-Karp dynamic programming: cost[S][j] is the length of the shortest path starting from the zero hole,
+# visiting all the holes of the set S and ending in j (j in S). Sets are bitmasks of the other size-1 holes and are
+# processed by number of holes, every layer is computed from the previous one with vectorized operations over all
+# its sets, so only two layers of costs are kept in memory (float32 by default) plus the predecessor of every
+# (set, last hole) as uint8, 2^(size-1)*(size-1) bytes in total (~92MB for 23 holes).
+# float32 costs can only mistake tours whose lengths differ by less than their rounding (relative 1e-7), the length
+# of the returned tour is computed again in float64
+def heldKarpModel(distanceMatrix, zeroHoleID, deadline, dtype=np.float32):
+    size = len(distanceMatrix)
+    if size > HELD_KARP_MAX_SIZE:
+        raise ValueError('Held-Karp is limited to {} holes, the instance has {} (use the dfj or flow formulation)'
+                         .format(HELD_KARP_MAX_SIZE, size))
+    zero = zeroHoleID-1
+    # hole 0 of the dynamic programming is the zero hole, the others are the holes of the set bitmasks
+    holes = np.array([zero] + [k for k in range(size) if k != zero])
+    distances = np.asarray(distanceMatrix, dtype=np.float64)[holes[:, None], holes[None, :]].astype(dtype)
+    nrHoles = size-1
+    if nrHoles <= 1:
+        return [holes.tolist()], True, 1
+    # sets grouped by number of holes, rank is the position of a set in its layer
+    masks = np.arange(1 << nrHoles, dtype=np.int64)
+    cardinality = np.zeros(len(masks), dtype=np.int8)
+    for j in range(nrHoles):
+        cardinality += (masks >> j) & 1
+    layers = np.split(masks[np.argsort(cardinality, kind='stable')], np.cumsum(np.bincount(cardinality))[:-1])
+    rank = np.empty(len(masks), dtype=np.int64)
+    for layer in layers:
+        rank[layer] = np.arange(len(layer))
+    # sets of one hole: path from the zero hole to j
+    costs = np.full((nrHoles, nrHoles), np.inf, dtype=dtype)
+    costs[np.arange(nrHoles), np.arange(nrHoles)] = distances[0, 1:]
+    predecessors = [None, np.zeros((nrHoles, nrHoles), dtype=np.uint8)]
+    for k in range(2, nrHoles+1):
+        if pastDeadline(deadline):
+            return None, False, 1
+        layer = layers[k]
+        newCosts = np.full((len(layer), nrHoles), np.inf, dtype=dtype)
+        newPredecessors = np.zeros((len(layer), nrHoles), dtype=np.uint8)
+        for j in range(nrHoles):
+            rows = np.flatnonzero((layer >> j) & 1)
+            # best last hole i before j, for all the sets containing j
+            candidates = costs[rank[layer[rows] ^ (1 << j)]] + distances[1:, j+1]
+            best = np.argmin(candidates, axis=1)
+            newCosts[rows, j] = candidates[np.arange(len(rows)), best]
+            newPredecessors[rows, j] = best
+        costs = newCosts
+        predecessors.append(newPredecessors)
+    # close the tour going back to the zero hole, then follow the predecessors
+    j = int(np.argmin(costs[0] + distances[1:, 0]))
+    mask = (1 << nrHoles)-1
+    path = []
+    for k in range(nrHoles, 0, -1):
+        path.append(j)
+        previous = int(predecessors[k][rank[mask], j])
+        mask ^= 1 << j
+        j = previous
+    tour = [zero] + holes[1:][path[::-1]].tolist()
+    return [tour], True, 1
+
+# Solve the TSP to optimality within the time limit (9999 means no limit).
+# Returns None if no solution was found in the time limit, otherwise the running time, the length of the tour,
+# the status ('optimal', or 'feasible' if the time limit was reached), the tour starting from the zero hole
+# (ids of the holes starting from 0) and the number of MILP solved (1 for Held-Karp)
+def exactModel(distanceMatrix, zeroHoleID=1, timeLimit=9999, formulation='dfj', mipGap=1e-4):
+    startTime = time.perf_counter()
+    deadline = deadlineAfter(timeLimit, startTime)
+    distanceMatrix = np.asarray(distanceMatrix, dtype=np.float64)
+    if formulation == 'auto':
+        formulation = 'heldkarp' if len(distanceMatrix) <= HELD_KARP_MAX_SIZE else 'dfj'
+    if formulation == 'heldkarp':
+        cycles, optimal, iterations = heldKarpModel(distanceMatrix, zeroHoleID, deadline)
+    elif formulation == 'flow':
+        cycles, optimal, iterations = flowModel(distanceMatrix, zeroHoleID, deadline, mipGap)
+    elif formulation == 'dfj':
+        cycles, optimal, iterations = dfjModel(distanceMatrix, deadline, mipGap)
+    else:
+        raise ValueError('Unknown formulation {}'.format(formulation))
+    if cycles is None:
+        return None
+    tour = mergeCycles(cycles, distanceMatrix)
+    start = tour.index(zeroHoleID-1)
+    tour = tour[start:] + tour[:start]
+    return {
+        'runningTime[ms]': round((time.perf_counter()-startTime)*1000, 1),
+        'objFunValue': tourLength(tour, distanceMatrix),
+        'status': 'optimal' if optimal else 'feasible',
+        'tour': tour,
+        'iterations': iterations
+    }
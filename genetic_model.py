@@ -1,64 +1,317 @@
 from deap import algorithms, base, creator, tools
 import random
 import numpy as np
-import time
 import multiprocessing
-from helpersGeneticAlgo import evalTSP, orderedCrossover, twoOptMutation, eaSimple
+from helpersGeneticAlgo import evalTSP, evalPopulation, evalPopulationFitnesses, orderedCrossover, twoOptMutation, eaSimple, \
+    nearestNeighbors, localSearch, improveTSP, deadlineAfter, pastDeadline, remainingTime, overshoot
+from functools import partial
+from helpersArrayPopulation import ArrayPopulation, ArrayHallOfFame, eaSimpleArray
+from helpersDistance import scalarLookup, compactDistances
+from helpersProfiling import NULL_PROFILER
+from helpersSeeding import seedTours, SEED_NEIGHBORS, SEED_TIME_SHARE
+from helpersSolutionCache import instanceFingerprint
 
-#########################
-### GENETIC ALGORITHM ###
-#########################
-def geneticModel(timeLimit, distanceMatrix, individualSize, populationSize, crossoverPB, mutationPB, nrGenerations, notImprovingLimit, keepHistory=False):
-    toolbox = base.Toolbox()
-    INDIVIDUAL_SIZE = individualSize
-
-    # CREATE BASE TYPES
+######################
+### SOLVER SESSION ###
+######################
+# CREATE BASE TYPES
+# deap types are global classes of the creator module, they are created once per process
+# (creating them again replaces the classes and deap warns about it)
+def createTypes():
     # Fitness (=path length) has negative weight because it will be minimized
     # (a minimizing fitness is built using negatives weights, while a maximizing fitness has positive weights)
-    creator.create('FitnessMin', base.Fitness, weights=(-1.0,))
+    if not hasattr(creator, 'FitnessMin'):
+        creator.create('FitnessMin', base.Fitness, weights=(-1.0,))
     # create individual class
     # Individual is identified by a list of floats, every float indicates the id of a node (a gene)
-    creator.create('Individual', list, fitness=creator.FitnessMin)
-    # indices indicates the list of individuals that compose a population.
-    # Composed by a random sample taken from the range of len equal to the size of the population we want.
-    # Random sample avoids the creation of duplicates in a single individual (each hole/gene is visited once)
-    toolbox.register('indices', random.sample, range(INDIVIDUAL_SIZE), INDIVIDUAL_SIZE)
-    toolbox.register('individual', tools.initIterate, creator.Individual, toolbox.indices)
-    toolbox.register('population', tools.initRepeat, list, toolbox.individual)
-
-    # SETUP GENETIC STEPS
-    # The following steps are performed in the order: mate, mutate, select
-    #toolbox.register('mate', tools.cxPartialyMatched)
-    toolbox.register('mate', orderedCrossover)
-    #toolbox.register('mutate', tools.mutShuffleIndexes, indpb=0.05)
-    toolbox.register('mutate', twoOptMutation)
-    # Tournsize indicates the nr of random individuals to take at each generation to extract the best fit.
-    # Taking now 5% of the population, among this subset, the best is taken.
-    # Tournament selects 5% of the population at random and keeps the fittest individual, this is cycled until
-    # a number of individuals equal to populationSize is extracted from the original population, these are
-    # the offsprings of the next generation
-    toolbox.register('select', tools.selTournament, tournsize=int(round(populationSize*0.05)))
-    toolbox.register('evaluate', evalTSP, distanceMatrix=distanceMatrix)
-
-    # LAUNCH OPTIMIZATION
-    history = tools.History()
-    # Decorate the variation operators
-    toolbox.decorate("mate", history.decorator)
-    toolbox.decorate("mutate", history.decorator)
-
-    pop = toolbox.population(n=populationSize)
-    history.update(pop)
-
-    # Hall of fame will store only one best individual of each generation
-    hof = tools.HallOfFame(1)
-    stats = tools.Statistics(lambda ind: ind.fitness.values)
+    if not hasattr(creator, 'Individual'):
+        creator.create('Individual', list, fitness=creator.FitnessMin)
+
+# Statistics of the fitness values stored in the logbook, key extracts the values from the individuals
+def fitnessStatistics(key=None):
+    stats = tools.Statistics() if key is None else tools.Statistics(key)
     stats.register("avg", np.mean)
     stats.register("std", np.std)
     stats.register("min", np.min)
     stats.register("max", np.max)
+    return stats
+
+# Identity of a distance matrix: arrays viewing the same memory (e.g. the views returned by the instance store
+# for the same instance) have the same key, the other backends are identified by the object itself
+def instanceKey(distanceMatrix):
+    if isinstance(distanceMatrix, np.ndarray):
+        return ('array', distanceMatrix.__array_interface__['data'][0], distanceMatrix.shape,
+                distanceMatrix.strides, distanceMatrix.dtype.str)
+    return ('object', id(distanceMatrix))
+
+# Long-lived solver, one per process (see processSession). The deap types, the toolbox, the history decorating the
+# variation operators and the statistics are set up once; the operators depending on the instance and the instance
+# precomputations (compact distances, distance lookup and neighbor lists of the local search) are kept while the same
+# instance is solved again, so the repeated solves of the sweeps and of the parameter exploration skip them.
+# Only the last instance is kept (with its precomputations), the history is cleared at every solve
+class SolverSession:
+    def __init__(self):
+        createTypes()
+        self.toolbox = base.Toolbox()
+        # SETUP GENETIC STEPS
+        # The following steps are performed in the order: mate, mutate, select
+        #self.toolbox.register('mate', tools.cxPartialyMatched)
+        self.toolbox.register('mate', orderedCrossover)
+        self.history = tools.History()
+        self.historyUpdate = self.history.update
+        # Decorate the variation operators
+        self.toolbox.decorate("mate", self.history.decorator)
+        self.stats = fitnessStatistics(lambda ind: ind.fitness.values)
+        # Statistics of the array representation are compiled on the fitness vector, so no key function is needed
+        self.arrayStats = fitnessStatistics()
+        self.tournsize = None
+        self.release()
+
+    # Drops the instance and the operators bound to it (e.g. before closing the shared memory of the distances)
+    def release(self):
+        for name in ['mutate', 'evaluate', 'improve', 'evaluatePopulation']:
+            if hasattr(self.toolbox, name):
+                self.toolbox.unregister(name)
+        self.source = None
+        self.sourceKey = None
+        self.operatorsKey = None
+        self.distances = None
+        self.lookup = None
+        self.neighbors = {}
+        self.sourceFingerprint = None
+
+    # Compact copy of the distances used during the search, computed again only for a new instance or storage
+    def prepare(self, distanceMatrix, distanceStorage='float64', packedDistances=False):
+        key = (instanceKey(distanceMatrix), distanceStorage, packedDistances)
+        if key != self.sourceKey:
+            # the source is referenced until the next instance, so its memory (and key) cannot be reused meanwhile
+            self.source = distanceMatrix
+            self.sourceKey = key
+            self.distances = compactDistances(distanceMatrix, distanceStorage, packedDistances)
+            self.lookup = None
+            self.neighbors = {}
+            self.sourceFingerprint = None
+            self.operatorsKey = None
+        return self.distances
+
+    # Fingerprint of the prepared instance, key of the solution cache (see helpersSolutionCache.py)
+    def fingerprint(self):
+        if self.sourceFingerprint is None:
+            self.sourceFingerprint = instanceFingerprint(self.source)
+        return self.sourceFingerprint
+
+    # Neighbor lists (the k closest nodes of every node) of the prepared instance
+    def candidates(self, k):
+        if k not in self.neighbors:
+            self.neighbors[k] = nearestNeighbors(self.distances, k)
+        return self.neighbors[k]
+
+    # Distance lookup and neighbor lists of the local search on the prepared instance
+    def localSearchData(self, localSearchNeighbors):
+        # Distances are read one at a time, which is faster on nested lists than on a numpy matrix
+        if self.lookup is None:
+            self.lookup = scalarLookup(self.distances)
+        return self.lookup, self.candidates(localSearchNeighbors)
+
+    # Tours of the construction heuristics for the initial population (see helpersSeeding.py), at least one tour
+    # is built (if count > 0, completed in id order if interrupted at the deadline), the following ones only before
+    # the deadline
+    def seeds(self, count, xTot=None, yTot=None, methods=None, deadline=None):
+        tours = []
+        if count > 0:
+            for tour in seedTours(self.distances, self.candidates(SEED_NEIGHBORS), xTot, yTot, methods, deadline):
+                tours.append(tour)
+                if len(tours) == count or pastDeadline(deadline):
+                    break
+        return tours
+
+    # Registers the operators of the prepared instance, unless they are already registered with the same settings
+    def registerOperators(self, individualSize, populationSize, deltaFitness, verifyDelta, localSearchPB,
+                          localSearchPasses, localSearchNeighbors):
+        toolbox = self.toolbox
+        distanceMatrix = self.distances
+        key = (individualSize, deltaFitness, verifyDelta, localSearchPB > 0, localSearchPasses, localSearchNeighbors)
+        if key != self.operatorsKey:
+            self.operatorsKey = key
+            # indices indicates the list of individuals that compose a population.
+            # Composed by a random sample taken from the range of len equal to the size of the population we want.
+            # Random sample avoids the creation of duplicates in a single individual (each hole/gene is visited once)
+            toolbox.register('indices', random.sample, range(individualSize), individualSize)
+            toolbox.register('individual', tools.initIterate, creator.Individual, toolbox.indices)
+            toolbox.register('population', tools.initRepeat, list, toolbox.individual)
+            #toolbox.register('mutate', tools.mutShuffleIndexes, indpb=0.05)
+            if deltaFitness:
+                # the mutation updates the fitness with the 2-opt delta instead of invalidating it
+                toolbox.register('mutate', twoOptMutation, distanceMatrix=distanceMatrix, verifyDelta=verifyDelta)
+            else:
+                toolbox.register('mutate', twoOptMutation)
+            toolbox.decorate("mutate", self.history.decorator)
+            toolbox.register('evaluate', evalTSP, distanceMatrix=distanceMatrix)
+            # Optional memetic step: a fraction localSearchPB of the offspring is improved with 2-opt/Or-opt local search
+            if localSearchPB > 0:
+                lookup, neighbors = self.localSearchData(localSearchNeighbors)
+                toolbox.register('improve', improveTSP, distanceMatrix=lookup, neighbors=neighbors,
+                                 maxPasses=localSearchPasses)
+            elif hasattr(toolbox, 'improve'):
+                toolbox.unregister('improve')
+            # Evaluate all the invalid individuals of a generation in a single vectorized pass (same values as evalTSP)
+            toolbox.register('evaluatePopulation', evalPopulationFitnesses, distanceMatrix=distanceMatrix)
+        # Tournsize indicates the nr of random individuals to take at each generation to extract the best fit.
+        # Taking now 5% of the population, among this subset, the best is taken.
+        # Tournament selects 5% of the population at random and keeps the fittest individual, this is cycled until
+        # a number of individuals equal to populationSize is extracted from the original population, these are
+        # the offsprings of the next generation
+        tournsize = int(round(populationSize*0.05))
+        if tournsize != self.tournsize:
+            self.tournsize = tournsize
+            toolbox.register('select', tools.selTournament, tournsize=tournsize)
+
+    # instance is the dictionary returned by loadInstance or the distance matrix itself (or any other distance
+    # backend), params are the other arguments of geneticModel (individualSize defaults to the instance size)
+    def solve(self, instance, params, timeLimit):
+        distanceMatrix = instance['dist'] if isinstance(instance, dict) else instance
+        params = dict(params)
+        params.setdefault('individualSize', len(distanceMatrix))
+        return self.run(timeLimit=timeLimit, distanceMatrix=distanceMatrix, **params)
+
+    # Same arguments and results of geneticModel
+    def run(self, timeLimit, distanceMatrix, individualSize, populationSize, crossoverPB, mutationPB, nrGenerations, notImprovingLimit, keepHistory=False, representation='list', deltaFitness=True, verifyDelta=False,
+            localSearchPB=0.0, localSearchPasses=1, localSearchNeighbors=8, migrate=None, migrationInterval=0,
+            distanceStorage='float64', packedDistances=False, profiler=None, anytime=False, checkEvery=16,
+            seedFraction=0.0, seedMethods=None, xTot=None, yTot=None, cache=None, warmStart=True):
+        deadline = deadlineAfter(timeLimit)
+        profiler = NULL_PROFILER if profiler is None else profiler
+        reportDistances = distanceMatrix
+        distanceMatrix = self.prepare(distanceMatrix, distanceStorage, packedDistances)
+        # the tours of the solution cache come first in the initial population (warm start),
+        # then a share seedFraction of the population is built with construction heuristics,
+        # within the first SEED_TIME_SHARE of the time limit
+        seedDeadline = None if deadline is None else deadline-timeLimit*(1-SEED_TIME_SHARE)
+        with profiler.phase('seeding'):
+            seeds = []
+            if cache is not None and warmStart:
+                cached = cache.get(self.fingerprint())
+                if cached is not None:
+                    seeds = [tour.tolist() for tour in cached[0][:populationSize]]
+            seeds += self.seeds(min(int(round(seedFraction*populationSize)), populationSize-len(seeds)), xTot, yTot,
+                                seedMethods, seedDeadline)
+        # The array representation stores the whole population in a single numpy matrix (see helpersArrayPopulation.py)
+        if representation == 'array':
+            improve = None
+            if localSearchPB > 0:
+                lookup, neighbors = self.localSearchData(localSearchNeighbors)
+                improve = partial(localSearch, distanceMatrix=lookup, neighbors=neighbors, maxPasses=localSearchPasses)
+            pop, logb, hof, generationLog = arrayGeneticModel(timeLimit, distanceMatrix, individualSize, populationSize,
+                                                              crossoverPB, mutationPB, nrGenerations, notImprovingLimit,
+                                                              keepHistory, deltaFitness, verifyDelta, localSearchPB,
+                                                              localSearchPasses, localSearchNeighbors, migrate,
+                                                              migrationInterval, reportDistances, profiler, anytime,
+                                                              checkEvery, deadline, improve, self.arrayStats, seeds)
+            # the best tour found is added to the solution cache
+            if cache is not None and len(hof) > 0:
+                cache.add(self.fingerprint(), hof.tours[:len(hof)], hof.fitness[:len(hof)])
+            logb.overshoot = overshoot(deadline)
+            return pop, logb, hof, generationLog
+        self.registerOperators(individualSize, populationSize, deltaFitness, verifyDelta, localSearchPB,
+                               localSearchPasses, localSearchNeighbors)
+        toolbox = self.toolbox
+
+        # LAUNCH OPTIMIZATION
+        # the genealogy of the previous solve is dropped
+        history = self.history
+        history.genealogy_index = 0
+        history.genealogy_history = {}
+        history.genealogy_tree = {}
+        # the genealogy bookkeeping of the history decorator is timed as its own phase
+        history.update = profiler.timed('history', self.historyUpdate)
+
+        pop = [creator.Individual(tour) for tour in seeds]
+        if anytime:
+            # the initial population (and its genealogy copy) is built within the time limit too,
+            # at least one individual is created
+            history.update(pop)
+            while len(pop) < populationSize and (len(pop) == 0 or not pastDeadline(deadline)):
+                pop.append(toolbox.individual())
+                history.update(pop[-1:])
+        else:
+            pop += toolbox.population(n=populationSize-len(pop))
+            history.update(pop)
+
+        # Hall of fame will store only one best individual of each generation
+        hof = tools.HallOfFame(1)
+
+        #pop, logb = algorithms.eaSimple(pop, toolbox, 0.7, 0.2, 30, stats=stats, halloffame=hof)
+        pop, logb, generationLog = eaSimple(pop, toolbox, crossoverPB, mutationPB, nrGenerations, stats=self.stats,
+                                            halloffame=hof, keepHistory=keepHistory,
+                                            timeLimit=remainingTime(deadline) if anytime else timeLimit,
+                                            notImprovingLimit=notImprovingLimit, deltaFitness=deltaFitness,
+                                            lspb=localSearchPB, migrate=migrate, migrationInterval=migrationInterval,
+                                            verbose=False, profiler=profiler, anytime=anytime, checkEvery=checkEvery)
+        # deltas (2-opt mutation and local search) and compact distances carry small rounding errors,
+        # the reported best fitness is computed again from scratch on the original distances
+        for ind in hof:
+            ind.fitness.values = evalTSP(ind, reportDistances)
+        # the best tour found is added to the solution cache
+        if cache is not None and len(hof) > 0:
+            cache.add(self.fingerprint(), [np.array(ind) for ind in hof], [ind.fitness.values[0] for ind in hof])
+        logb.overshoot = overshoot(deadline)
+        return pop, logb, hof, generationLog
+
+# Session shared by all the solves of the current process (worker processes get their own)
+SESSION = None
+
+def processSession():
+    global SESSION
+    if SESSION is None:
+        SESSION = SolverSession()
+    return SESSION
+
+#########################
+### GENETIC ALGORITHM ###
+#########################
+# distanceMatrix is the dense distance matrix or any other distance backend of helpersDistance.py (CoordinateDistance).
+# distanceStorage ('float64', 'float32', 'uint16', 'uint32') and packedDistances select a compact copy of the distance
+# matrix used during the search (see CompactDistance), the reported best fitness is always computed on distanceMatrix.
+# profiler (see helpersProfiling.py) adds the time of every phase and the operation counters to the logbook records.
+# With anytime the time limit covers the whole call (setup included), the deadline is checked every checkEvery
+# individuals and a solution is always returned (see eaSimple). logb.overshoot is the time [s] spent past the deadline.
+# seedFraction is the share of the initial population built with the construction heuristics seedMethods
+# (see helpersSeeding.py, all of them by default), the space filling curve needs the coordinates xTot and yTot.
+# With a solution cache (see helpersSolutionCache.py) the tours cached for the instance are injected in the initial
+# population (unless warmStart is False, for cold runs) and the best tour found is added to the cache.
+# The solve runs on the session of the process (see SolverSession.run for the arguments)
+def geneticModel(*args, **kargs):
+    return processSession().run(*args, **kargs)
+
+# Same genetic algorithm of geneticModel, using an array backed population instead of creator.Individual lists.
+# No deap types nor history are needed: selection, crossover, mutation and hall of fame work on matrix rows.
+def arrayGeneticModel(timeLimit, distanceMatrix, individualSize, populationSize, crossoverPB, mutationPB, nrGenerations, notImprovingLimit, keepHistory=False, deltaFitness=True, verifyDelta=False,
+                      localSearchPB=0.0, localSearchPasses=1, localSearchNeighbors=8, migrate=None, migrationInterval=0,
+                      reportDistances=None, profiler=None, anytime=False, checkEvery=16, deadline=None, improve=None,
+                      stats=None, seeds=None):
+    deadline = deadlineAfter(timeLimit) if deadline is None else deadline
+    profiler = NULL_PROFILER if profiler is None else profiler
+    reportDistances = distanceMatrix if reportDistances is None else reportDistances
+    if improve is None and localSearchPB > 0:
+        improve = partial(localSearch, distanceMatrix=scalarLookup(distanceMatrix),
+                          neighbors=nearestNeighbors(distanceMatrix, localSearchNeighbors), maxPasses=localSearchPasses)
+    pop = ArrayPopulation.random(populationSize, individualSize)
+    # the first rows are replaced by the seed tours
+    if seeds:
+        pop.tours[:len(seeds)] = seeds
+    hof = ArrayHallOfFame(1, individualSize)
+    # Statistics are compiled on the fitness vector, so no key function is needed
+    stats = fitnessStatistics() if stats is None else stats
 
-    sta = time.time()
-    #pop, logb = algorithms.eaSimple(pop, toolbox, 0.7, 0.2, 30, stats=stats, halloffame=hof)
-    pop, logb, generationLog = eaSimple(pop, toolbox, crossoverPB, mutationPB, nrGenerations, stats=stats, halloffame=hof,
-                                    keepHistory=keepHistory, timeLimit=timeLimit, notImprovingLimit=notImprovingLimit, verbose=False)
-    return pop, logb, hof, generationLog
\ No newline at end of file
+    pop, logb, generationLog = eaSimpleArray(pop, distanceMatrix, crossoverPB, mutationPB, nrGenerations,
+                                             tournsize=int(round(populationSize*0.05)), stats=stats, halloffame=hof,
+                                             keepHistory=keepHistory,
+                                             timeLimit=remainingTime(deadline) if anytime else timeLimit,
+                                             notImprovingLimit=notImprovingLimit, deltaFitness=deltaFitness,
+                                             verifyDelta=verifyDelta, lspb=localSearchPB, improve=improve,
+                                             migrate=migrate, migrationInterval=migrationInterval, verbose=False,
+                                             profiler=profiler, anytime=anytime, checkEvery=checkEvery)
+    if len(hof) > 0:
+        hof.fitness[:len(hof)] = evalPopulation(hof.tours[:len(hof)], reportDistances)
+    logb.overshoot = overshoot(deadline)
+    return pop, logb, hof, generationLog
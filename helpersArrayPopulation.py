@@ -0,0 +1,289 @@
+import time
+import numpy as np
+from deap import tools
+from helpersGeneticAlgo import evalPopulation, orderedCrossoverBatch, twoOptDeltaBatch, checkDelta, outOfTime, notImproving, \
+    deadlineAfter, pastDeadline
+from helpersProfiling import NULL_PROFILER
+
+# Array-backed alternative to the list based creator.Individual population used in genetic_model.py.
+# The whole population is a single contiguous integer matrix of shape (populationSize, individualSize)
+# plus a fitness vector, so selection, crossover and mutation work on row indices and copy rows
+# into preallocated buffers instead of cloning one python object per individual at every generation.
+
+#############################
+### POPULATION CONTAINERS ###
+#############################
+def tourDtype(individualSize):
+    # Smallest integer type able to store all the gene ids
+    if individualSize <= np.iinfo(np.int16).max:
+        return np.int16
+    return np.int32
+
+class ArrayPopulation:
+    def __init__(self, size, individualSize):
+        self.tours = np.empty((size, individualSize), dtype=tourDtype(individualSize))
+        self.fitness = np.full(size, np.inf)
+        # valid plays the role of ind.fitness.valid of the list representation
+        self.valid = np.zeros(size, dtype=bool)
+
+    @classmethod
+    def random(cls, size, individualSize):
+        # Every row is a random permutation of the gene ids (same as random.sample in the list version)
+        population = cls(size, individualSize)
+        population.tours[:] = np.argsort(np.random.random((size, individualSize)), axis=1)
+        return population
+
+    def __len__(self):
+        return self.tours.shape[0]
+
+    def evaluate(self, distanceMatrix, deadline=None, checkEvery=16):
+        # Evaluate only the individuals with an invalid fitness, returns the nr of evaluations.
+        # With a deadline (anytime mode) rows are evaluated checkEvery at a time until the deadline is reached,
+        # the first chunk is always evaluated
+        invalid = np.flatnonzero(~self.valid)
+        chunkSize = invalid.size if deadline is None else checkEvery
+        for start in range(0, invalid.size, max(chunkSize, 1)):
+            if start > 0 and pastDeadline(deadline):
+                return start
+            rows = invalid[start:start+chunkSize]
+            self.fitness[rows] = evalPopulation(self.tours[rows], distanceMatrix)
+            self.valid[rows] = True
+        return invalid.size
+
+    # Hall of fame update after an evaluation interrupted at the deadline: rows still to be evaluated are excluded
+    def discardInvalid(self):
+        self.fitness[~self.valid] = np.inf
+
+    def copyRowsFrom(self, other, rows):
+        # Fill this population with the given rows of another population (used after selection)
+        np.take(other.tours, rows, axis=0, out=self.tours)
+        np.take(other.fitness, rows, out=self.fitness)
+        np.take(other.valid, rows, out=self.valid)
+
+# Minimal stand-in of the deap Fitness object, so that hof.keys[0].values[0] keeps working
+class ArrayFitness:
+    def __init__(self, value):
+        self.values = (value,)
+
+class ArrayHallOfFame:
+    def __init__(self, maxsize, individualSize):
+        self.maxsize = maxsize
+        self.tours = np.empty((maxsize, individualSize), dtype=tourDtype(individualSize))
+        self.fitness = np.full(maxsize, np.inf)
+        self.size = 0
+
+    def update(self, population):
+        # Only the best maxsize individuals of the population can enter the hall of fame
+        candidates = np.argsort(population.fitness)[:self.maxsize]
+        for row in candidates:
+            fit = population.fitness[row]
+            if self.size == self.maxsize and fit >= self.fitness[self.size-1]:
+                break
+            tour = population.tours[row]
+            # skip individuals already stored (same as the similarity check of tools.HallOfFame)
+            if any(np.array_equal(tour, self.tours[k]) for k in range(self.size)):
+                continue
+            position = int(np.searchsorted(self.fitness[:self.size], fit, side='right'))
+            last = min(self.size, self.maxsize-1)
+            self.tours[position+1:last+1] = self.tours[position:last]
+            self.fitness[position+1:last+1] = self.fitness[position:last]
+            self.tours[position] = tour
+            self.fitness[position] = fit
+            self.size = min(self.size+1, self.maxsize)
+
+    @property
+    def items(self):
+        return [self.tours[k].tolist() for k in range(self.size)]
+
+    @property
+    def keys(self):
+        return [ArrayFitness(self.fitness[k]) for k in range(self.size)]
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        return self.items[i]
+
+##########################
+### GENETIC OPERATORS ###
+##########################
+# Vectorized version of tools.selTournament, returns the row indices of the selected individuals
+def selTournamentArray(population, k, tournsize):
+    aspirants = np.random.randint(0, len(population), size=(k, tournsize))
+    best = np.argmin(population.fitness[aspirants], axis=1)
+    return aspirants[np.arange(k), best]
+
+# Draw two distinct cut points for each of the nr individuals (as np.random.choice(individualSize, 2, replace=False))
+def randomCutPoints(nr, individualSize):
+    geneIds = np.empty((nr, 2), dtype=np.int64)
+    geneIds[:, 0] = np.random.randint(0, individualSize, size=nr)
+    geneIds[:, 1] = np.random.randint(0, individualSize-1, size=nr)
+    geneIds[:, 1] += geneIds[:, 1] >= geneIds[:, 0]
+    return geneIds
+
+# Reverse the genes between geneMin and geneMax (excluded) of the given rows, all at once
+def twoOptMutationBatch(tours, rows, geneMin, geneMax):
+    positions = np.arange(tours.shape[1])
+    inside = (positions >= geneMin[:, None]) & (positions < geneMax[:, None])
+    source = np.where(inside, (geneMin+geneMax-1)[:, None]-positions, positions)
+    tours[rows] = np.take_along_axis(tours[rows], source, axis=1)
+
+# When distanceMatrix is given, the fitness of the mutated individuals that are still valid (not crossed)
+# is updated with the 2-opt delta instead of being invalidated
+def varAndArray(offspring, cxpb, mutpb, distanceMatrix=None, verifyDelta=False, profiler=NULL_PROFILER):
+    tours = offspring.tours
+    individualSize = tours.shape[1]
+
+    # Apply ordered crossover to the selected consecutive pairs, all at once
+    pairs = np.flatnonzero(np.random.random(len(offspring)//2) < cxpb)
+    if pairs.size > 0:
+        orderedCrossoverBatch(tours, 2*pairs, 2*pairs+1, randomCutPoints(pairs.size, individualSize))
+        offspring.valid[2*pairs] = False
+        offspring.valid[2*pairs+1] = False
+
+    # Apply 2-opt mutation (reverse the genes between two random cut points)
+    rows = np.flatnonzero(np.random.random(len(offspring)) < mutpb)
+    if rows.size > 0:
+        geneIds = randomCutPoints(rows.size, individualSize)
+        geneMin, geneMax = geneIds.min(axis=1), geneIds.max(axis=1)
+        if distanceMatrix is not None:
+            validRows = offspring.valid[rows]
+            offspring.fitness[rows[validRows]] += twoOptDeltaBatch(tours[rows[validRows]], geneMin[validRows],
+                                                                   geneMax[validRows], distanceMatrix)
+        else:
+            offspring.valid[rows] = False
+        twoOptMutationBatch(tours, rows, geneMin, geneMax)
+        if distanceMatrix is not None and verifyDelta:
+            updated = rows[offspring.valid[rows]]
+            checkDelta(offspring.fitness[updated], evalPopulation(tours[updated], distanceMatrix))
+    profiler.count('crossovers', pairs.size)
+    profiler.count('mutations', rows.size)
+    return offspring
+
+###########################
+### COMPLETE ALGORITHM ###
+###########################
+# Same flow of eaSimple in helpersGeneticAlgo.py, working on an ArrayPopulation.
+# Population and offspring are two preallocated buffers swapped at every generation.
+# In anytime mode the evaluation checks the deadline every checkEvery rows (the variation is a single vectorized pass)
+def eaSimpleArray(population, distanceMatrix, cxpb, mutpb, ngen, tournsize, stats=None,
+                  halloffame=None, keepHistory=False, timeLimit=9999, notImprovingLimit=0, deltaFitness=False,
+                  verifyDelta=False, lspb=0.0, improve=None, migrate=None, migrationInterval=0,
+                  verbose=__debug__, profiler=NULL_PROFILER, anytime=False, checkEvery=16):
+
+    startTime = time.perf_counter()
+    deadline = deadlineAfter(timeLimit, startTime)
+    evaluationDeadline = deadline if anytime else None
+    generationLog = []
+    avgFitnessHistory = []
+    logbook = tools.Logbook()
+    logbook.header = ['gen', 'nevals'] + (stats.fields if stats else [])
+
+    # Check time limit constraint
+    if outOfTime(startTime, timeLimit) and not anytime:
+        return population, logbook, False
+
+    with profiler.phase('evaluate'):
+        invalid = len(population)-int(population.valid.sum())
+        nevals = population.evaluate(distanceMatrix, evaluationDeadline, checkEvery)
+    profiler.count('evaluations', nevals)
+    if outOfTime(startTime, timeLimit) and not anytime:
+        return population, logbook, False
+
+    # anytime mode: deadline reached before the end of the first evaluation
+    if nevals < invalid:
+        population.discardInvalid()
+    if halloffame is not None:
+        with profiler.phase('halloffame'):
+            halloffame.update(population)
+    if nevals < invalid:
+        return population, logbook, generationLog
+
+    if notImprovingLimit>0:
+        avgFitnessHistory = [np.mean(population.fitness)]
+    if outOfTime(startTime, timeLimit) or notImproving(avgFitnessHistory, notImprovingLimit):
+        return population, logbook, generationLog
+
+    # statistics are computed directly on the fitness vector
+    with profiler.phase('stats'):
+        record = stats.compile(population.fitness) if stats else {}
+    logbook.record(gen=0, nevals=nevals, **record, **profiler.endGeneration(0))
+    if verbose:
+        print(logbook.stream)
+
+    if keepHistory:
+        generationLog = [population.tours.copy()]
+
+    if outOfTime(startTime, timeLimit):
+        return population, logbook, generationLog
+
+    offspring = ArrayPopulation(len(population), population.tours.shape[1])
+    for gen in range(1, ngen + 1):
+        # Select the rows of the next generation candidates and copy them in the offspring buffer
+        with profiler.phase('select'):
+            selected = selTournamentArray(population, len(population), tournsize)
+            offspring.copyRowsFrom(population, selected)
+
+        with profiler.phase('variation'):
+            offspring = varAndArray(offspring, cxpb, mutpb, distanceMatrix=distanceMatrix if deltaFitness else None,
+                                    verifyDelta=verifyDelta, profiler=profiler)
+
+        if outOfTime(startTime, timeLimit):
+            return population, logbook, generationLog
+
+        with profiler.phase('evaluate'):
+            invalid = len(offspring)-int(offspring.valid.sum())
+            nevals = offspring.evaluate(distanceMatrix, evaluationDeadline, checkEvery)
+        profiler.count('evaluations', nevals)
+        # rows whose fitness is still valid (not varied, or updated with the 2-opt delta) are not evaluated
+        profiler.count('skippedEvaluations', len(offspring)-invalid)
+        # anytime mode: deadline reached during the evaluation, the evaluated offspring can still improve the best
+        if nevals < invalid:
+            offspring.discardInvalid()
+            if halloffame is not None:
+                halloffame.update(offspring)
+            return population, logbook, generationLog
+
+        # Improve a fraction of the offspring with local search (memetic step), within the time limit.
+        # improve takes a tour and returns the improved tour and its length variation (see localSearch)
+        if lspb > 0:
+            rows = np.flatnonzero(np.random.random(len(offspring)) < lspb)
+            improved = 0
+            with profiler.phase('localSearch'):
+                for row in rows:
+                    if pastDeadline(deadline):
+                        break
+                    tour, delta = improve(offspring.tours[row].tolist(), deadline=deadline, checkEvery=checkEvery)
+                    offspring.tours[row] = tour
+                    offspring.fitness[row] += delta
+                    improved += 1
+            profiler.count('localSearches', improved)
+
+        if halloffame is not None:
+            with profiler.phase('halloffame'):
+                halloffame.update(offspring)
+
+        # Replace the current population by the offspring (swap the two buffers)
+        population, offspring = offspring, population
+
+        with profiler.phase('stats'):
+            record = stats.compile(population.fitness) if stats else {}
+        logbook.record(gen=gen, nevals=nevals, **record, **profiler.endGeneration(gen))
+        if verbose:
+            print(logbook.stream)
+
+        # Island model: exchange individuals with the other islands every migrationInterval generations
+        # (the migration time is recorded with the next generation)
+        if migrate is not None and gen % migrationInterval == 0:
+            with profiler.phase('migrate'):
+                migrate(population)
+
+        if keepHistory:
+            generationLog.append(population.tours.copy())
+        if notImprovingLimit>0:
+            avgFitnessHistory.append(np.mean(population.fitness))
+        if outOfTime(startTime, timeLimit) or notImproving(avgFitnessHistory, notImprovingLimit):
+            return population, logbook, generationLog
+
+    return population, logbook, generationLog
@@ -0,0 +1,188 @@
+import gc
+import sys
+import time
+import json
+import timeit
+import random
+import platform
+import resource
+import tracemalloc
+import numpy as np
+import deap
+from deap import base, creator, tools
+from scipy.spatial import distance_matrix
+from genetic_model import geneticModel, createTypes
+from helpersGeneticAlgo import evalTSP, evalPopulation, crossIndividuals, orderedCrossover, twoOptMutation, varAnd
+from helpersInstances import listInstances, loadInstance
+from config import GENETIC_MODEL_CONFIG
+
+# Benchmarks of the genetic algorithm used by 015-benchmark.py.
+# Micro benchmarks time the single operators (evaluation, crossover, mutation, variation, selection) on random
+# individuals, macro benchmarks run complete geneticModel solves for a fixed number of generations.
+# Everything is seeded, so two runs on the same code execute the same operations. Results are dictionaries
+# benchmark name -> metrics, stored in a baseline file and compared with the results of later runs.
+
+SEED = 42
+# synthetic instances (uniform random points) on top of the instances of the points folders
+SYNTHETIC_SIZES = [500, 1000, 3000]
+MACRO_GENERATIONS = 20
+# metrics where a higher value is better, for all the others lower is better
+HIGHER_IS_BETTER = ['generations/s', 'evaluations/s']
+
+#################
+### INSTANCES ###
+#################
+def syntheticInstance(size, seed=SEED):
+    points = np.random.RandomState(seed).uniform(0, 100, size=(size, 2))
+    return distance_matrix(points, points)
+
+# Distance matrices of the benchmark instances: the first distribution of every points folder and the synthetic
+# instances, size -> distance matrix
+def benchmarkInstances(synthetic=SYNTHETIC_SIZES, pointsDir='./points/'):
+    instances = {}
+    for p, distributions in listInstances(pointsDir).items():
+        instances[int(p)] = np.asarray(loadInstance(p, distributions[0], pointsDir)['dist'])
+    for size in synthetic:
+        instances[size] = syntheticInstance(size)
+    return dict(sorted(instances.items()))
+
+def seed(value=SEED):
+    random.seed(value)
+    np.random.seed(value)
+
+# Seconds per call of func: the number of calls is scaled so that a run lasts at least 0.2s (as timeit does),
+# the best of repeat runs is kept
+def timePerCall(func, repeat=3):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number))/number
+
+########################
+### MICRO BENCHMARKS ###
+########################
+# Time per call [us] of the operators of the list representation on one instance
+def microBenchmarks(distanceMatrix, populationSize=GENETIC_MODEL_CONFIG['populationSize']):
+    createTypes()
+    seed()
+    size = len(distanceMatrix)
+    lookup = distanceMatrix.tolist()
+    population = [creator.Individual(random.sample(range(size), size)) for _ in range(populationSize)]
+    for ind in population:
+        ind.fitness.values = evalTSP(ind, distanceMatrix)
+    tours = np.array(population)
+    ind1, ind2 = creator.Individual(population[0]), creator.Individual(population[1])
+    # the mutation updates a valid fitness with the 2-opt delta, as in geneticModel
+    mutant = creator.Individual(population[2])
+    mutant.fitness.values = evalTSP(mutant, distanceMatrix)
+    geneIds = np.random.choice(range(size), 2, replace=False)
+
+    toolbox = base.Toolbox()
+    toolbox.register('mate', orderedCrossover)
+    toolbox.register('mutate', twoOptMutation, distanceMatrix=distanceMatrix)
+    tournsize = max(int(round(populationSize*0.05)), 1)
+
+    results = {
+        'evalTSP': timePerCall(lambda: evalTSP(ind1, lookup)),
+        'evalTSP[matrix]': timePerCall(lambda: evalTSP(ind1, distanceMatrix)),
+        'evalPopulation[per individual]': timePerCall(lambda: evalPopulation(tours, distanceMatrix))/populationSize,
+        'crossIndividuals': timePerCall(lambda: crossIndividuals(ind1, ind2, geneIds)),
+        'orderedCrossover': timePerCall(lambda: orderedCrossover(ind1, ind2)),
+        'twoOptMutation': timePerCall(lambda: twoOptMutation(mutant, distanceMatrix)),
+        'varAnd': timePerCall(lambda: varAnd(population, toolbox, GENETIC_MODEL_CONFIG['crossoverPB'],
+                                             GENETIC_MODEL_CONFIG['mutationPB'], deltaFitness=True)),
+        'selTournament': timePerCall(lambda: tools.selTournament(population, populationSize, tournsize))
+    }
+    return {name: {'time[us]': seconds*1e6} for name, seconds in results.items()}
+
+########################
+### MACRO BENCHMARKS ###
+########################
+def solve(distanceMatrix, representation, generations):
+    seed()
+    config = dict(GENETIC_MODEL_CONFIG, nrGenerations=generations, notImprovingLimit=0)
+    return geneticModel(timeLimit=9999, distanceMatrix=distanceMatrix, individualSize=len(distanceMatrix),
+                        representation=representation, **config)
+
+# Complete geneticModel solve without time limit nor early stopping: time per generation [ms], generations and
+# evaluations per second (best of repeat identical solves), peak memory [MB] traced during a separate solve
+def macroBenchmark(distanceMatrix, representation='list', generations=MACRO_GENERATIONS, repeat=3):
+    elapsed = np.inf
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        pop, logb, hof, generationLog = solve(distanceMatrix, representation, generations)
+        elapsed = min(elapsed, time.perf_counter()-start)
+    evaluations = sum(logb.select('nevals'))
+
+    # tracing slows down the solve, so the peak memory is measured on a separate run
+    gc.collect()
+    tracemalloc.start()
+    solve(distanceMatrix, representation, generations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'time per generation[ms]': elapsed/len(logb)*1000,
+        'time per evaluation[us]': elapsed/evaluations*1e6,
+        'generations/s': len(logb)/elapsed,
+        'evaluations/s': evaluations/elapsed,
+        'peak memory[MB]': peak/2**20,
+        'best fitness': float(hof.keys[0].values[0])
+    }
+
+#################
+### BASELINES ###
+#################
+# Run all the benchmarks, returns the baseline dictionary (environment and results)
+def runBenchmarks(instances, representations=('list', 'array'), generations=MACRO_GENERATIONS):
+    results = {}
+    for size, distanceMatrix in instances.items():
+        print('Benchmarking instance with {} points'.format(size))
+        for name, metrics in microBenchmarks(distanceMatrix).items():
+            results['{}/{}'.format(name, size)] = metrics
+        for representation in representations:
+            name = 'geneticModel[{}]/{}'.format(representation, size)
+            results[name] = macroBenchmark(distanceMatrix, representation, generations)
+    return {
+        'environment': {
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'deap': deap.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'maxrss[MB]': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+        },
+        'seed': SEED,
+        'generations': generations,
+        'results': results
+    }
+
+def saveBaseline(baseline, path):
+    with open(path, 'wt') as fout:
+        json.dump(baseline, fout, indent=1)
+
+def loadBaseline(path):
+    with open(path) as fin:
+        return json.load(fin)
+
+# Compare the results with the baseline, returns the list of (benchmark, metric, baseline value, current value,
+# relative change) of every metric present in both. A change is a regression when the metric got worse by more
+# than threshold (relative). The best fitness is not a performance metric: a different best fitness means that the
+# seeded solve did not run the same operations of the baseline, and it is only reported
+def compareResults(baseline, current, threshold=0.1):
+    comparisons, regressions = [], []
+    for name, metrics in current['results'].items():
+        for metric, value in metrics.items():
+            reference = baseline['results'].get(name, {}).get(metric)
+            if reference is None or reference == 0:
+                continue
+            if metric == 'best fitness':
+                if value != reference:
+                    print('Warning: best fitness of {} changed from {} to {}'.format(name, reference, value))
+                continue
+            change = value/reference-1
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            comparisons.append((name, metric, reference, value, change))
+            if worse > threshold:
+                regressions.append((name, metric, reference, value, change))
+    return comparisons, regressions
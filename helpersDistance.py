@@ -0,0 +1,195 @@
+import math
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Distance backends of the genetic algorithm.
+# The default backend is the dense distance matrix saved with every instance (numpy array, n x n, float64).
+# The other backends support the same indexing used on the distance matrix: distances[a][b] and distances[a, b]
+# for single edges, distances[rows, cols] for vectorized batches of edges. Single distances are python floats and
+# batches are float64 arrays whatever the storage, so tour lengths are always accumulated in float64.
+# - CoordinateDistance keeps only the coordinates of the points and computes the euclidean distances when they are
+#   read, so memory grows with n instead of n^2. Distances are computed with the same formula of
+#   scipy.spatial.distance_matrix, so it gives the same values of the distance matrix.
+# - CompactDistance stores the distance matrix in less memory (float32, integers, packed upper triangle),
+#   trading some precision of the tour lengths (see CompactDistance for the error bounds).
+
+class DistanceBackend:
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            a, b = key
+            if np.isscalar(a) and np.isscalar(b):
+                return self.distance(a, b)
+            return self.distances(np.asarray(a), np.asarray(b))
+        if np.isscalar(key):
+            return DistanceRow(self, key)
+        # several rows at once, as in the distance matrix
+        return self.distances(np.asarray(key)[..., None], np.arange(len(self)))
+
+    # Candidate lists (same as nearestNeighbors in helpersGeneticAlgo.py): for every node the ids of the k closest
+    # other nodes, sorted by distance. Rows are computed a block at a time, the full matrix is never built
+    def nearestNeighbors(self, k, blockSize=1024):
+        size = len(self)
+        k = min(k, size-1)
+        neighbors = []
+        for start in range(0, size, blockSize):
+            rows = np.arange(start, min(start+blockSize, size))
+            distances = self[rows]
+            distances[np.arange(len(rows)), rows] = np.inf
+            closest = np.argpartition(distances, k-1, axis=1)[:, :k]
+            order = np.argsort(np.take_along_axis(distances, closest, axis=1), axis=1)
+            neighbors += np.take_along_axis(closest, order, axis=1).tolist()
+        return neighbors
+
+# Row a of the distances, so that distances[a][b] works as on the distance matrix
+class DistanceRow:
+    def __init__(self, distances, a):
+        self.distances = distances
+        self.a = a
+
+    def __getitem__(self, b):
+        if np.isscalar(b):
+            return self.distances.distance(self.a, b)
+        return self.distances.distances(self.a, np.asarray(b))
+
+    def __len__(self):
+        return len(self.distances)
+
+############################
+### COORDINATE DISTANCES ###
+############################
+class CoordinateDistance(DistanceBackend):
+    def __init__(self, xTot, yTot):
+        self.x = np.ascontiguousarray(xTot, dtype=np.float64)
+        self.y = np.ascontiguousarray(yTot, dtype=np.float64)
+        # single distances are computed on python floats, faster than indexing numpy arrays one item at a time
+        self.xList = self.x.tolist()
+        self.yList = self.y.tolist()
+        self.shape = (len(self.xList), len(self.xList))
+        self.tree = None
+
+    def distance(self, a, b):
+        dx = self.xList[a]-self.xList[b]
+        dy = self.yList[a]-self.yList[b]
+        return math.sqrt(dx*dx + dy*dy)
+
+    def distances(self, a, b):
+        dx = self.x[a]-self.x[b]
+        dy = self.y[a]-self.y[b]
+        return np.sqrt(dx*dx + dy*dy)
+
+    # Candidate lists computed with a KD-tree on the coordinates, built once and kept for the next queries
+    def nearestNeighbors(self, k):
+        k = min(k, len(self)-1)
+        if self.tree is None:
+            self.tree = cKDTree(np.stack((self.x, self.y), axis=-1))
+        # the closest point of every node is the node itself
+        _, closest = self.tree.query(np.stack((self.x, self.y), axis=-1), k=k+1)
+        neighbors = []
+        for node, candidates in enumerate(closest.tolist()):
+            # duplicated points can be returned before the node itself
+            candidates = [c for c in candidates if c != node]
+            neighbors.append(candidates[:k])
+        return neighbors
+
+    # pickled without the KD-tree, which is built again when needed (e.g. in the island model workers)
+    def __getstate__(self):
+        return {'x': self.x, 'y': self.y}
+
+    def __setstate__(self, state):
+        self.__init__(state['x'], state['y'])
+
+#########################
+### COMPACT DISTANCES ###
+#########################
+# Distance matrix stored with a smaller type and/or as packed upper triangle. Memory with respect to the float64
+# matrix: float32 and uint32 1/2, uint16 1/4; packed halves it again (n(n-1)/2 values, the matrix is symmetric
+# with zero diagonal), so uint16 packed takes 1/8. Errors on the length L of a tour of n edges, compared with the
+# float64 distance matrix (on top of the float64 rounding of the sum, the same of the float64 path):
+# - float64 packed: none, same values of the matrix
+# - float32: every distance has relative error at most 2^-24 (round to nearest), so |error| <= 2^-24 * L
+# - uint16/uint32: distances are stored as round(d*scale) with scale = (2^bits-1)/max(d), every distance has
+#   absolute error at most 1/(2*scale), so |error| <= n*max(d)/(2*(2^bits-1))
+class CompactDistance(DistanceBackend):
+    def __init__(self, distanceMatrix, dtype='float32', packed=False):
+        distanceMatrix = np.asarray(distanceMatrix, dtype=np.float64)
+        size = distanceMatrix.shape[0]
+        self.shape = (size, size)
+        self.dtype = np.dtype(dtype)
+        self.packed = packed
+        if packed:
+            if not np.array_equal(distanceMatrix, distanceMatrix.T) or np.any(np.diag(distanceMatrix) != 0):
+                raise ValueError('A packed distance matrix must be symmetric with zero diagonal')
+            values = distanceMatrix[np.triu_indices(size, k=1)]
+        else:
+            values = distanceMatrix
+        self.scale = 1.0
+        if self.dtype.kind == 'u':
+            maxDistance = float(values.max()) if values.size > 0 else 0.0
+            if maxDistance > 0:
+                self.scale = (np.iinfo(self.dtype).max)/maxDistance
+            values = np.round(values*self.scale)
+        elif self.dtype.kind != 'f':
+            raise ValueError('Unsupported distance type {}'.format(dtype))
+        self.values = np.ascontiguousarray(values, dtype=self.dtype)
+
+    # Maximum error on the length of a tour, compared with the float64 distance matrix (see above)
+    def maxTourError(self, tourLength):
+        if self.dtype.kind == 'u':
+            return len(self)/(2*self.scale)
+        return tourLength*np.finfo(self.dtype).eps/2 if self.dtype != np.float64 else 0.0
+
+    # position of the edge (a, b) in the packed upper triangle
+    def packedIndex(self, a, b):
+        if a > b:
+            a, b = b, a
+        return a*(2*self.shape[0]-a-1)//2 + b-a-1
+
+    def distance(self, a, b):
+        if self.packed:
+            if a == b:
+                return 0.0
+            value = self.values[self.packedIndex(a, b)]
+        else:
+            value = self.values[a, b]
+        return float(value)/self.scale
+
+    def distances(self, a, b):
+        if self.packed:
+            a, b = np.broadcast_arrays(a, b)
+            low, high = np.minimum(a, b).astype(np.int64), np.maximum(a, b).astype(np.int64)
+            index = low*(2*self.shape[0]-low-1)//2 + high-low-1
+            # the diagonal is not stored, index is only used where the nodes differ
+            values = np.where(low == high, 0, self.values[np.maximum(index, 0)])
+        else:
+            values = self.values[a, b]
+        values = values.astype(np.float64)
+        if self.dtype.kind == 'u':
+            values /= self.scale
+        return values
+
+# Distance matrix in the storage selected for geneticModel: 'float64' (the matrix itself), 'float32', 'uint16'
+# or 'uint32', optionally packed as upper triangle
+def compactDistances(distanceMatrix, storage='float64', packed=False):
+    if storage == 'float64' and not packed:
+        return distanceMatrix
+    if isinstance(distanceMatrix, DistanceBackend):
+        raise ValueError('Compact storage needs a distance matrix, not {}'.format(type(distanceMatrix).__name__))
+    return CompactDistance(distanceMatrix, dtype=storage, packed=packed)
+
+# Backend used to read distances one at a time (local search): nested lists for the distance matrix,
+# the other backends themselves
+def scalarLookup(distanceMatrix):
+    if isinstance(distanceMatrix, DistanceBackend):
+        return distanceMatrix
+    return np.asarray(distanceMatrix).tolist()
+
+# Distance backend of an instance returned by loadInstance: 'matrix' (dense distance matrix) or 'coordinates'
+def instanceDistances(instance, backend='matrix'):
+    if backend == 'coordinates':
+        return CoordinateDistance(instance['xTot'], instance['yTot'])
+    if backend == 'matrix':
+        return instance['dist']
+    raise ValueError('Unknown distance backend {}'.format(backend))
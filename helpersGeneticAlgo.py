@@ -2,6 +2,8 @@ import time
 import numpy as np
 import random
 from deap import tools
+from helpersDistance import DistanceBackend
+from helpersProfiling import NULL_PROFILER
 
 # Some of the following functions were taken from:
 # https://github.com/DEAP/deap/blob/master/deap/algorithms.py
@@ -22,6 +24,23 @@ def evalTSP(individual, distanceMatrix):
         distance += distanceMatrix[gene1][gene2]
     return distance,
 
+# Batch version of evalTSP, computes the route length of all the individuals at once.
+# Individuals are stacked in a 2D array of tours (one row per individual) and the edges of every route
+# are gathered with a single fancy indexing pass over the distance matrix.
+def evalPopulation(individuals, distanceMatrix):
+    tours = np.asarray(individuals)
+    if tours.ndim != 2 or tours.shape[0] == 0:
+        return np.empty(0)
+    # Rolling by one gives the previous node of each gene, so the first edge is the closing one (last->first)
+    # exactly as in evalTSP. cumsum adds the edges sequentially in the same order of evalTSP, so the fitness
+    # values are identical to the ones computed one individual at a time (np.sum would use pairwise summation)
+    edges = distanceMatrix[np.roll(tours, 1, axis=1), tours]
+    return np.cumsum(edges, axis=1)[:, -1]
+
+# Evaluate a list of individuals with the batch evaluator, returning the fitness tuples as toolbox.map would do
+def evalPopulationFitnesses(individuals, distanceMatrix):
+    return [(distance,) for distance in evalPopulation(individuals, distanceMatrix)]
+
 ###################################
 ### CROSSOVER(MATING) FUNCTIONS ###
 ###################################
@@ -30,7 +49,14 @@ def crossIndividuals(ind1, ind2, geneIds):
     geneMin, geneMax = sorted(geneIds)
     start = ind1[:geneMin]
     end = ind1[geneMax:]
-    middle = [gene for gene in ind2 if gene not in start+end]
+    # Mark the genes already taken from ind1, so that checking if a gene of ind2 is used is O(1)
+    # (the crossover is linear in the individual size instead of quadratic)
+    used = [False]*len(ind1)
+    for gene in start:
+        used[gene] = True
+    for gene in end:
+        used[gene] = True
+    middle = [gene for gene in ind2 if not used[gene]]
     return start+middle+end
 
 def orderedCrossover(ind1, ind2):
@@ -41,28 +67,274 @@ def orderedCrossover(ind1, ind2):
     ind2[:] = crossIndividuals(ind2, ind1, geneIds)
     return ind1, ind2
 
+# Batched ordered crossover, crosses many pairs of parents stored as rows of 2D arrays.
+# geneIds has shape (nrPairs, 2) and contains the cut points of each pair, for the same cut points
+# the children are the same returned by crossIndividuals
+def crossIndividualsBatch(parents1, parents2, geneIds):
+    nrPairs, individualSize = parents1.shape
+    geneMin = geneIds.min(axis=1)[:, None]
+    geneMax = geneIds.max(axis=1)[:, None]
+    positions = np.arange(individualSize)
+    # genes of parents1 kept in place (start and end of the individual)
+    kept = (positions < geneMin) | (positions >= geneMax)
+    rows = np.arange(nrPairs)[:, None]
+    # every row is a permutation, so each gene is written exactly once in the used mask
+    used = np.zeros((nrPairs, individualSize), dtype=bool)
+    used[rows, parents1] = kept
+    children = parents1.copy()
+    # boolean indexing runs row by row and every row has geneMax-geneMin missing genes,
+    # so the unused genes of parents2 fill the middle of each child in their original order
+    children[~kept] = parents2[~used[rows, parents2]]
+    return children
+
+# Batched version of orderedCrossover on the rows of tours, pairs are given as two arrays of row indices.
+# As in orderedCrossover, the second child is built from the second parent and the first child
+def orderedCrossoverBatch(tours, rows1, rows2, geneIds):
+    children1 = crossIndividualsBatch(tours[rows1], tours[rows2], geneIds)
+    tours[rows2] = crossIndividualsBatch(tours[rows2], children1, geneIds)
+    tours[rows1] = children1
+    return tours
+
 ############################
 ### MUTATION FUNCTIONS ###
 ############################
 # Custom function for 2-opt mutation
-def twoOptMutation(ind):
+# When a distance matrix is given and the individual has a valid fitness, the fitness is updated with the
+# length variation of the move instead of being invalidated (no full evaluation is needed afterwards).
+# verifyDelta is a debug mode that checks every delta against a full evaluation of the route
+def twoOptMutation(ind, distanceMatrix=None, verifyDelta=False):
     # print('### 4. MUTATION')
     geneMin, geneMax = sorted(np.random.choice(range(len(ind)), 2, replace=False))
+    newFitness = None
+    if distanceMatrix is not None and ind.fitness.valid:
+        newFitness = ind.fitness.values[0] + twoOptDelta(ind, geneMin, geneMax, distanceMatrix)
     start = ind[:geneMin]
     end = ind[geneMax:]
     middle = list(reversed(ind[geneMin:geneMax]))
     ind[:] = start+middle+end
+    if newFitness is not None:
+        ind.fitness.values = newFitness,
+        if verifyDelta:
+            checkDelta(newFitness, evalTSP(ind, distanceMatrix)[0])
+    return ind,
+
+# Length variation of a route when the genes between geneMin and geneMax (excluded) are reversed.
+# A 2-opt move only replaces the two edges at the borders of the reversed segment, so with a symmetric
+# distance matrix the variation is computed in O(1)
+def twoOptDelta(ind, geneMin, geneMax, distanceMatrix):
+    size = len(ind)
+    # reversing all the genes (or all but one) gives back the same cycle walked in the opposite direction
+    if geneMax-geneMin >= size-1:
+        return 0.0
+    prevGene = ind[geneMin-1]
+    firstGene = ind[geneMin]
+    lastGene = ind[geneMax-1]
+    nextGene = ind[geneMax % size]
+    return (distanceMatrix[prevGene][lastGene] + distanceMatrix[firstGene][nextGene]
+            - distanceMatrix[prevGene][firstGene] - distanceMatrix[lastGene][nextGene])
+
+# Batched version of twoOptDelta for many routes stored as rows of a 2D array,
+# geneMin and geneMax are arrays with the cut points of each route
+def twoOptDeltaBatch(tours, geneMin, geneMax, distanceMatrix):
+    size = tours.shape[1]
+    rows = np.arange(tours.shape[0])
+    prevGenes = tours[rows, geneMin-1]
+    firstGenes = tours[rows, geneMin]
+    lastGenes = tours[rows, geneMax-1]
+    nextGenes = tours[rows, geneMax % size]
+    delta = (distanceMatrix[prevGenes, lastGenes] + distanceMatrix[firstGenes, nextGenes]
+             - distanceMatrix[prevGenes, firstGenes] - distanceMatrix[lastGenes, nextGenes])
+    delta[geneMax-geneMin >= size-1] = 0.0
+    return delta
+
+def checkDelta(updatedFitness, fullFitness):
+    # deltas accumulate rounding errors, so a small relative tolerance is allowed
+    assert np.all(np.abs(updatedFitness-fullFitness) <= 1e-9*np.maximum(1.0, np.abs(fullFitness))), \
+        'Delta fitness {} does not match full evaluation {}'.format(updatedFitness, fullFitness)
+
+
+############################
+### LOCAL SEARCH FUNCTIONS ###
+############################
+# Memetic improvement operator: 2-opt and Or-opt local search applied to the offspring.
+# Moves are only searched among the k nearest neighbors of each node (candidate lists), and nodes whose
+# surroundings did not change are skipped (don't-look bits), so a pass is close to linear in the individual size.
+
+# Candidate lists: for every node the ids of the k closest other nodes, sorted by distance
+def nearestNeighbors(distanceMatrix, k):
+    # the other distance backends compute the candidates without building a dense float64 matrix
+    if isinstance(distanceMatrix, DistanceBackend):
+        return distanceMatrix.nearestNeighbors(k)
+    distances = np.array(distanceMatrix, dtype=float)
+    size = distances.shape[0]
+    k = min(k, size-1)
+    np.fill_diagonal(distances, np.inf)
+    closest = np.argpartition(distances, k-1, axis=1)[:, :k]
+    order = np.argsort(np.take_along_axis(distances, closest, axis=1), axis=1)
+    return np.take_along_axis(closest, order, axis=1).tolist()
+
+# Reverse the tour between positions i and j (included) walking forward, updating the positions of the nodes.
+# Reversing the complementary part gives the same cycle, so the shorter of the two is reversed
+def reverseSegment(tour, position, i, j):
+    size = len(tour)
+    length = (j-i) % size + 1
+    if 2*length > size:
+        i, j = (j+1) % size, (i-1) % size
+        length = size-length
+    for _ in range(length//2):
+        a, b = tour[i], tour[j]
+        tour[i], tour[j] = b, a
+        position[b], position[a] = i, j
+        i = (i+1) % size
+        j = (j-1) % size
+
+# Try the 2-opt moves that connect node a to one of its neighbors, returns the length variation (0 if no move)
+def twoOptMove(tour, position, a, distanceMatrix, neighbors):
+    size = len(tour)
+    succA = tour[(position[a]+1) % size]
+    predA = tour[position[a]-1]
+    for b, forward in ((succA, True), (predA, False)):
+        dab = distanceMatrix[a][b]
+        for c in neighbors[a]:
+            dac = distanceMatrix[a][c]
+            # neighbors are sorted, no further neighbor can shorten the edge (a,b)
+            if dac >= dab:
+                break
+            d = tour[(position[c]+1) % size] if forward else tour[position[c]-1]
+            if c == b or d == a:
+                continue
+            delta = dac + distanceMatrix[b][d] - dab - distanceMatrix[c][d]
+            if delta < -1e-10:
+                # ... a [b ... c] d ... becomes ... a c ... b d ...
+                if forward:
+                    reverseSegment(tour, position, position[b], position[c])
+                else:
+                    reverseSegment(tour, position, position[a], position[d])
+                return delta, (a, b, c, d)
+    return 0.0, ()
+
+# Try to move a segment of 1 to 3 nodes starting at node a next to one of the neighbors of a
+def orOptMove(tour, position, a, distanceMatrix, neighbors):
+    size = len(tour)
+    start = position[a]
+    for length in (1, 2, 3):
+        if length > size-3:
+            break
+        segment = [tour[(start+k) % size] for k in range(length)]
+        last = segment[-1]
+        prev = tour[start-1]
+        nxt = tour[(start+length) % size]
+        removeGain = distanceMatrix[prev][a] + distanceMatrix[last][nxt] - distanceMatrix[prev][nxt]
+        for c in neighbors[a]:
+            if distanceMatrix[a][c] >= removeGain:
+                break
+            if c in segment:
+                continue
+            succC = tour[(position[c]+1) % size]
+            predC = tour[position[c]-1]
+            # insert as c a ... last succC or as predC last ... a c (segment reversed)
+            options = []
+            if succC not in segment:
+                options.append((distanceMatrix[c][a] + distanceMatrix[last][succC] - distanceMatrix[c][succC], c, False))
+            if predC not in segment:
+                options.append((distanceMatrix[predC][last] + distanceMatrix[a][c] - distanceMatrix[predC][c], predC, True))
+            for addCost, after, reversedSegment in options:
+                delta = addCost - removeGain
+                if delta < -1e-10:
+                    rest = [tour[(start+length+k) % size] for k in range(size-length)]
+                    insertAt = rest.index(after)+1
+                    moved = segment[::-1] if reversedSegment else segment
+                    tour[:] = rest[:insertAt] + moved + rest[insertAt:]
+                    for i, gene in enumerate(tour):
+                        position[gene] = i
+                    return delta, (prev, nxt, after, a, last)
+    return 0.0, ()
+
+# Apply 2-opt and Or-opt moves until no improving move is found, maxPasses are done or the deadline is reached
+# (time.perf_counter clock, see deadlineAfter). The deadline is checked every checkEvery nodes and after every
+# Or-opt move, which rebuilds the whole tour. Returns the improved tour and the length variation
+def localSearch(tour, distanceMatrix, neighbors, maxPasses=1, deadline=None, checkEvery=16):
+    tour = list(tour)
+    size = len(tour)
+    if size < 5 or pastDeadline(deadline):
+        return tour, 0.0
+    position = [0]*size
+    for i, gene in enumerate(tour):
+        position[gene] = i
+    totalDelta = 0.0
+    # don't-look bits: only the nodes in the queue are processed, a node goes back to the queue
+    # when one of its edges is changed by a move
+    queue = list(tour)
+    queued = [True]*size
+    for _ in range(maxPasses):
+        nextQueue = []
+        for nr, a in enumerate(queue):
+            if deadline is not None and nr % checkEvery == 0 and pastDeadline(deadline):
+                return tour, totalDelta
+            queued[a] = False
+            delta, touched = twoOptMove(tour, position, a, distanceMatrix, neighbors)
+            if delta == 0.0:
+                delta, touched = orOptMove(tour, position, a, distanceMatrix, neighbors)
+                if delta < 0.0 and pastDeadline(deadline):
+                    return tour, totalDelta+delta
+            if delta < 0.0:
+                totalDelta += delta
+                for gene in touched:
+                    if not queued[gene]:
+                        queued[gene] = True
+                        nextQueue.append(gene)
+        if not nextQueue:
+            break
+        queue = nextQueue
+    return tour, totalDelta
+
+# Improvement operator to be registered in the toolbox, updates the individual and its fitness in place
+def improveTSP(ind, distanceMatrix, neighbors, maxPasses=1, deadline=None, checkEvery=16):
+    tour, delta = localSearch(ind, distanceMatrix, neighbors, maxPasses, deadline, checkEvery)
+    ind[:] = tour
+    if ind.fitness.valid:
+        ind.fitness.values = ind.fitness.values[0]+delta,
     return ind,
 
 
 ###########################
 ### COMPLETE ALGORITHM ###
 ###########################
+# Time limits are measured on the monotonic clock time.perf_counter, not affected by updates of the system clock.
+# A time limit of 9999 means no time limit
 def outOfTime(startTime, timeLimit):
     if timeLimit == 9999:
         return False
-    if time.time()-startTime > timeLimit:
+    if time.perf_counter()-startTime > timeLimit:
         return True
+
+# Absolute deadline on the monotonic clock, None without time limit
+def deadlineAfter(timeLimit, startTime=None):
+    if timeLimit == 9999:
+        return None
+    return (time.perf_counter() if startTime is None else startTime)+timeLimit
+
+def pastDeadline(deadline):
+    return deadline is not None and time.perf_counter() >= deadline
+
+# Time left before the deadline, as time limit for a nested solve
+def remainingTime(deadline):
+    return 9999 if deadline is None else max(deadline-time.perf_counter(), 0.0)
+
+# Time spent past the deadline [s], 0 if the deadline was met or without time limit
+def overshoot(deadline):
+    return 0.0 if deadline is None else max(time.perf_counter()-deadline, 0.0)
+
+# Anytime evaluation: the individuals are evaluated checkEvery at a time until the deadline is reached.
+# The first chunk is always evaluated, so at least one individual has a fitness. Returns the nr of evaluations
+def evaluateUntil(individuals, evaluateAll, deadline, checkEvery):
+    for start in range(0, len(individuals), checkEvery):
+        if start > 0 and pastDeadline(deadline):
+            return start
+        chunk = individuals[start:start+checkEvery]
+        for ind, fit in zip(chunk, evaluateAll(chunk)):
+            ind.fitness.values = fit
+    return len(individuals)
 # Function to implement early stopping
 def notImproving(fitnessHistory, limit):
     if limit == 0:
@@ -75,47 +347,88 @@ def notImproving(fitnessHistory, limit):
             print('   Early stopping, no improvement for {} iterations'.format(limit))
             return True  
 
-def varAnd(population, toolbox, cxpb, mutpb):
-    offspring = [toolbox.clone(ind) for ind in population]
+# With deltaFitness the mutation operator keeps the fitness of the individuals up to date (see twoOptMutation),
+# so only the individuals changed by crossover need a full evaluation.
+# With a deadline (anytime mode) the time is checked every checkEvery individuals, None is returned when the
+# deadline is reached before the end of the variation
+def varAnd(population, toolbox, cxpb, mutpb, deltaFitness=False, profiler=NULL_PROFILER, deadline=None, checkEvery=16):
+    with profiler.phase('clone'):
+        offspring = []
+        for ind in population:
+            if deadline is not None and len(offspring) % checkEvery == 0 and pastDeadline(deadline):
+                return None
+            offspring.append(toolbox.clone(ind))
 
     # Apply crossover and mutation on the offspring. Offspring has the same size as population
+    crossovers = 0
     for i in range(1, len(offspring), 2):
+        if deadline is not None and i % checkEvery == 1 and pastDeadline(deadline):
+            return None
         if random.random() < cxpb:
             offspring[i - 1], offspring[i] = toolbox.mate(offspring[i - 1], offspring[i])
             # delete fitness value which will be updated later
             del offspring[i - 1].fitness.values, offspring[i].fitness.values
+            crossovers += 1
 
+    mutations = 0
     for i in range(len(offspring)):
+        if deadline is not None and i % checkEvery == 0 and pastDeadline(deadline):
+            return None
         if random.random() < mutpb:
             offspring[i], = toolbox.mutate(offspring[i])
-            del offspring[i].fitness.values
+            if not deltaFitness:
+                del offspring[i].fitness.values
+            mutations += 1
+    profiler.count('crossovers', crossovers)
+    profiler.count('mutations', mutations)
     return offspring
     
+# In anytime mode the deadline is also checked every checkEvery individuals during the variation and the evaluation,
+# and the initial population is always (at least partially) evaluated, so the hall of fame always contains the best
+# individual found before the deadline and the generation log is never False
 def eaSimple(population, toolbox, cxpb, mutpb, ngen, stats=None,
-             halloffame=None, keepHistory=False, timeLimit=9999, notImprovingLimit=0, verbose=__debug__):
+             halloffame=None, keepHistory=False, timeLimit=9999, notImprovingLimit=0, deltaFitness=False, lspb=0.0,
+             migrate=None, migrationInterval=0, verbose=__debug__, profiler=NULL_PROFILER, anytime=False,
+             checkEvery=16):
     
-    startTime = time.time()
+    startTime = time.perf_counter()
+    deadline = deadlineAfter(timeLimit, startTime)
     generationLog = []
     avgFitnessHistory = []
     logbook = tools.Logbook()
     logbook.header = ['gen', 'nevals'] + (stats.fields if stats else [])
+    # Use the whole-population evaluator when registered in the toolbox, otherwise evaluate one individual at a time
+    evaluateAll = getattr(toolbox, 'evaluatePopulation', None)
+    if evaluateAll is None:
+        evaluateAll = lambda individuals: toolbox.map(toolbox.evaluate, individuals)
     
     # Check time limit constraint
-    if outOfTime(startTime, timeLimit):
+    if outOfTime(startTime, timeLimit) and not anytime:
         return population, logbook, False
 
     # Evaluate the individuals with an invalid fitness.
     # Invalid means that the fitness has not yet been computed
-    invalid_ind = [ind for ind in population if not ind.fitness.valid]
-    fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
-    if outOfTime(startTime, timeLimit):
+    with profiler.phase('evaluate'):
+        invalid_ind = [ind for ind in population if not ind.fitness.valid]
+        if anytime:
+            nevals = evaluateUntil(invalid_ind, evaluateAll, deadline, checkEvery)
+        else:
+            fitnesses = evaluateAll(invalid_ind)
+            nevals = len(invalid_ind)
+    if outOfTime(startTime, timeLimit) and not anytime:
         return population, logbook, False
-    for ind, fit in zip(invalid_ind, fitnesses):
-        ind.fitness.values = fit
+    if not anytime:
+        for ind, fit in zip(invalid_ind, fitnesses):
+            ind.fitness.values = fit
+    profiler.count('evaluations', nevals)
         
     # Populate hall of fame with best individuals
     if halloffame is not None:
-        halloffame.update(population)
+        with profiler.phase('halloffame'):
+            halloffame.update([ind for ind in population if ind.fitness.valid])
+    # anytime mode: deadline reached before the end of the first evaluation
+    if nevals < len(invalid_ind):
+        return population, logbook, generationLog
 
     # Check early stopping constraint and time limit constraint
     if notImprovingLimit>0:
@@ -124,8 +437,9 @@ def eaSimple(population, toolbox, cxpb, mutpb, ngen, stats=None,
         return population, logbook, generationLog
 
     # update statistics
-    record = stats.compile(population) if stats else {}
-    logbook.record(gen=0, nevals=len(invalid_ind), **record)
+    with profiler.phase('stats'):
+        record = stats.compile(population) if stats else {}
+    logbook.record(gen=0, nevals=nevals, **record, **profiler.endGeneration(0))
     if verbose:
         print(logbook.stream)
     
@@ -144,35 +458,72 @@ def eaSimple(population, toolbox, cxpb, mutpb, ngen, stats=None,
         # The next command runs the selTournament function (tools.selTournament on genetic_model.py) which selects
         # batches of individuals and keeps the best one, until a number equal to len(population) is extracted.
         # These will be the new generation candidates that will go through crossover and mutation.
-        offspring = toolbox.select(population, len(population))
+        with profiler.phase('select'):
+            offspring = toolbox.select(population, len(population))
         
         # print('### 2. APPLY CROSSOVER AND MUTATION')
         # Vary the pool of individuals (apply crossover and mutation, with given probabilities)
         # the following command will call orderedCrossover first, and then twoOptMutation, as defined in genetic_model.py
-        offspring = varAnd(offspring, toolbox, cxpb, mutpb)
+        with profiler.phase('variation'):
+            offspring = varAnd(offspring, toolbox, cxpb, mutpb, deltaFitness=deltaFitness, profiler=profiler,
+                               deadline=deadline if anytime else None, checkEvery=checkEvery)
 
-        if outOfTime(startTime, timeLimit):
+        # (in anytime mode the variation is interrupted at the deadline)
+        if offspring is None or outOfTime(startTime, timeLimit):
             return population, logbook, generationLog
         
         # Evaluate the individuals with an invalid fitness
         # (update fitness of new offsprings)
-        invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
-        fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
-        for ind, fit in zip(invalid_ind, fitnesses):
-            ind.fitness.values = fit
+        with profiler.phase('evaluate'):
+            invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
+            if anytime:
+                nevals = evaluateUntil(invalid_ind, evaluateAll, deadline, checkEvery)
+            else:
+                fitnesses = evaluateAll(invalid_ind)
+                for ind, fit in zip(invalid_ind, fitnesses):
+                    ind.fitness.values = fit
+                nevals = len(invalid_ind)
+        profiler.count('evaluations', nevals)
+        # offspring whose fitness is still valid (not varied, or updated with the 2-opt delta) are not evaluated
+        profiler.count('skippedEvaluations', len(offspring)-len(invalid_ind))
+        # anytime mode: deadline reached during the evaluation, the evaluated offspring can still improve the best
+        if nevals < len(invalid_ind):
+            if halloffame is not None:
+                halloffame.update([ind for ind in offspring if ind.fitness.valid])
+            return population, logbook, generationLog
+
+        # Improve a fraction of the offspring with local search (memetic step), within the time limit
+        if lspb > 0:
+            with profiler.phase('localSearch'):
+                improved = 0
+                for ind in offspring:
+                    if pastDeadline(deadline):
+                        break
+                    if random.random() < lspb:
+                        toolbox.improve(ind, deadline=deadline, checkEvery=checkEvery)
+                        improved += 1
+            profiler.count('localSearches', improved)
 
         # Update the hall of fame with the generated individuals
         if halloffame is not None:
-            halloffame.update(offspring)
+            with profiler.phase('halloffame'):
+                halloffame.update(offspring)
 
         # Replace the current population by the offspring
         population[:] = offspring
 
         # Append the current generation statistics to the logbook
-        record = stats.compile(population) if stats else {}
-        logbook.record(gen=gen, nevals=len(invalid_ind), **record)
+        with profiler.phase('stats'):
+            record = stats.compile(population) if stats else {}
+        logbook.record(gen=gen, nevals=nevals, **record, **profiler.endGeneration(gen))
         if verbose:
             print(logbook.stream)
+
+        # Island model: exchange individuals with the other islands every migrationInterval generations
+        # (the migration time is recorded with the next generation)
+        if migrate is not None and gen % migrationInterval == 0:
+            with profiler.phase('migrate'):
+                migrate(population)
         
         if keepHistory:
             generationLog.append(offspring)
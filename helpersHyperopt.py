@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import sqlite3
+import datetime
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from hyperopt import tpe, Trials, STATUS_FAIL, JOB_STATE_DONE, JOB_STATE_ERROR, JOB_STATE_RUNNING
+from hyperopt.base import Domain, spec_from_misc
+from hyperopt.fmin import space_eval
+from helpersSweep import reseedWorker
+# telegram notifications are optional, the exploration can run offline
+try:
+    import telegram_send
+except ImportError:
+    telegram_send = None
+
+# Parallel backend for the hyperparameter space exploration of 004-hypspace-exploration.py.
+# N local worker processes evaluate the trials while TPE suggests new points asynchronously (running trials
+# are seen by TPE as not yet evaluated). Trials are stored in a local SQLite file, so the exploration can be
+# inspected while running and resumed after being stopped, without a MongoDB server.
+
+def notify(message):
+    if telegram_send is None:
+        return
+    try:
+        telegram_send.send([message])
+    except Exception as e:
+        print('Telegram notification failed:', e)
+
+#########################
+### SQLITE TRIAL STORE ###
+#########################
+# Convert numpy values and dates contained in the hyperopt documents to json types
+def jsonDefault(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+class SQLiteTrialStore:
+    def __init__(self, path):
+        self.path = path
+        with self.connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS trials (tid INTEGER PRIMARY KEY, state INTEGER, loss REAL, '
+                       'doc TEXT, updated REAL)')
+
+    def connect(self):
+        # a new connection for each operation, so the store can be read by other processes while running
+        return sqlite3.connect(self.path, timeout=30)
+
+    def save(self, doc):
+        loss = doc['result'].get('loss')
+        with self.connect() as db:
+            db.execute('INSERT OR REPLACE INTO trials VALUES (?, ?, ?, ?, ?)',
+                       (doc['tid'], doc['state'], loss, json.dumps(doc, default=jsonDefault), time.time()))
+
+    def load(self, states=(JOB_STATE_DONE, JOB_STATE_ERROR)):
+        with self.connect() as db:
+            rows = db.execute('SELECT doc FROM trials WHERE state IN ({}) ORDER BY tid'.format(
+                ','.join('?'*len(states))), tuple(states)).fetchall()
+        docs = [json.loads(doc) for doc, in rows]
+        for doc in docs:
+            # dates are stored as strings, hyperopt only needs them to be set
+            doc['book_time'] = doc['refresh_time'] = None
+        return docs
+
+    def discardUnfinished(self):
+        # trials left running by an interrupted exploration are evaluated again
+        with self.connect() as db:
+            db.execute('DELETE FROM trials WHERE state NOT IN (?, ?)', (JOB_STATE_DONE, JOB_STATE_ERROR))
+
+    def nextTid(self):
+        with self.connect() as db:
+            tid, = db.execute('SELECT MAX(tid) FROM trials').fetchone()
+        return 0 if tid is None else tid+1
+
+    def summary(self):
+        with self.connect() as db:
+            counts = dict(db.execute('SELECT state, COUNT(*) FROM trials GROUP BY state').fetchall())
+            best = db.execute('SELECT tid, loss FROM trials WHERE state = ? AND loss IS NOT NULL '
+                              'ORDER BY loss LIMIT 1', (JOB_STATE_DONE,)).fetchone()
+        return {'done': counts.get(JOB_STATE_DONE, 0), 'errors': counts.get(JOB_STATE_ERROR, 0),
+                'running': counts.get(JOB_STATE_RUNNING, 0), 'best': best}
+
+#########################
+### PARALLEL EXECUTOR ###
+#########################
+# Parallel equivalent of hyperopt fmin with tpe.suggest.
+# objective must be a picklable function returning a hyperopt result dictionary, onResult(doc) is called in this
+# process every time a trial finishes. Returns the hyperopt Trials object with all the completed trials.
+def parallelFmin(objective, space, maxEvals, storePath, workers=None, seed=None, onResult=None):
+    workers = workers or os.cpu_count()
+    store = SQLiteTrialStore(storePath)
+    domain = Domain(objective, space)
+    trials = Trials()
+    # resume the trials completed by a previous run
+    previous = store.load()
+    trials.insert_trial_docs(previous)
+    trials.refresh()
+    nextTid = store.nextTid()
+    store.discardUnfinished()
+    rng = np.random.default_rng(seed)
+    completed = len(previous)
+
+    running = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=reseedWorker) as executor:
+        while completed+len(running) < maxEvals or running:
+            # keep all the workers busy with new suggestions
+            while len(running) < workers and completed+len(running) < maxEvals:
+                doc, = tpe.suggest([nextTid], domain, trials, rng.integers(2**31-1))
+                doc['state'] = JOB_STATE_RUNNING
+                doc['book_time'] = datetime.datetime.now()
+                trials.insert_trial_docs([doc])
+                trials.refresh()
+                # trials stores a copy of the document, the copy is the one to be updated with the result
+                doc = next(trial for trial in trials.trials if trial['tid'] == nextTid)
+                nextTid += 1
+                store.save(doc)
+                params = space_eval(space, spec_from_misc(doc['misc']))
+                running[executor.submit(objective, params)] = doc
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                doc = running.pop(future)
+                try:
+                    doc['result'] = future.result()
+                    doc['state'] = JOB_STATE_DONE
+                except Exception as e:
+                    doc['result'] = {'status': STATUS_FAIL, 'failure': repr(e)}
+                    doc['state'] = JOB_STATE_ERROR
+                doc['refresh_time'] = datetime.datetime.now()
+                store.save(doc)
+                completed += 1
+                if onResult is not None:
+                    onResult(doc)
+            trials.refresh()
+    return trials
@@ -0,0 +1,223 @@
+import os
+from os import walk, listdir
+import re
+import json
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+# Loading layer for the point distributions (instances) shared by the scripts.
+# Instances are read from the consolidated instance store when available (see InstanceStore), otherwise from the
+# .npz files of the points folders. Decoded .npz files are kept in memory, so loading the same instance again
+# costs nothing. The cache is bounded in bytes with least recently used eviction, and a cached instance is loaded
+# again when its file changes (modification time and size, optionally the content hash).
+
+######################
+### INSTANCE CACHE ###
+######################
+class InstanceCache:
+    def __init__(self, maxBytes=512*2**20, checkHash=False):
+        self.maxBytes = maxBytes
+        self.checkHash = checkHash
+        self.entries = OrderedDict()
+        self.currentBytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def signature(self, path):
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if self.checkHash:
+            with open(path, 'rb') as fin:
+                signature += (hashlib.sha1(fin.read()).hexdigest(),)
+        return signature
+
+    def load(self, path):
+        signature = self.signature(path)
+        entry = self.entries.get(path)
+        if entry is not None and entry[0] == signature:
+            self.entries.move_to_end(path)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        if entry is not None:
+            self.evict(path)
+        with np.load(path) as npzfile:
+            arrays = {name: npzfile[name] for name in npzfile.files}
+        # cached arrays are shared by all the callers, they must not be modified
+        for array in arrays.values():
+            array.setflags(write=False)
+        nbytes = sum(array.nbytes for array in arrays.values())
+        # instances larger than the whole cache are returned without being stored
+        if nbytes <= self.maxBytes:
+            while self.currentBytes+nbytes > self.maxBytes:
+                self.evict(next(iter(self.entries)))
+            self.entries[path] = (signature, arrays, nbytes)
+            self.currentBytes += nbytes
+        return arrays
+
+    def evict(self, path):
+        signature, arrays, nbytes = self.entries.pop(path)
+        self.currentBytes -= nbytes
+
+    def clear(self):
+        self.entries.clear()
+        self.currentBytes = 0
+
+######################
+### INSTANCE STORE ###
+######################
+# Single store holding coordinates, distance matrices and metadata of all the instances.
+# Arrays are appended to one raw binary file (data.bin) and index.json records, for every instance, the offset,
+# shape and type of its arrays together with the OPL metadata (zeroHoleID). The data file is memory mapped, so
+# listing the instances is a lookup in the index and reading one instance does not load the rest of the store.
+# OPL .dat files are written from the store on demand.
+class InstanceStore:
+    ALIGNMENT = 64
+
+    def __init__(self, storeDir='./instances/'):
+        self.storeDir = storeDir
+        self.indexPath = os.path.join(storeDir, 'index.json')
+        self.dataPath = os.path.join(storeDir, 'data.bin')
+        self.index = {'instances': {}}
+        if os.path.exists(self.indexPath):
+            with open(self.indexPath) as fin:
+                self.index = json.load(fin)
+        self.data = None
+
+    def exists(self):
+        return len(self.index['instances']) > 0
+
+    def key(self, p, i):
+        return '{}/{}'.format(p, i)
+
+    def __contains__(self, instance):
+        return self.key(*instance) in self.index['instances']
+
+    # Same format of listInstances: points -> ids of the point distributions
+    def instances(self):
+        instances = {}
+        for entry in self.index['instances'].values():
+            instances.setdefault(entry['points'], []).append(entry['id'])
+        return {p: sorted(ids) for p, ids in sorted(instances.items())}
+
+    def append(self, fout, array):
+        # arrays are aligned, so that the memory mapped views are aligned too
+        offset = fout.tell()
+        padding = -offset % self.ALIGNMENT
+        fout.write(b'\0'*padding)
+        array = np.ascontiguousarray(array)
+        fout.write(array.tobytes())
+        return {'offset': offset+padding, 'shape': list(array.shape), 'dtype': array.dtype.str}
+
+    # Overwrite the bytes of an array already in the data file
+    def overwrite(self, fout, array, entry):
+        if entry['shape'] != list(array.shape) or entry['dtype'] != array.dtype.str:
+            raise ValueError('Array of shape {} cannot replace an array of shape {}'.format(list(array.shape),
+                                                                                            entry['shape']))
+        fout.seek(entry['offset'])
+        fout.write(np.ascontiguousarray(array).tobytes())
+
+    # An instance already in the store is overwritten in place, so the data file does not grow
+    def add(self, p, i, xTot, yTot, dist, zeroHoleID):
+        os.makedirs(self.storeDir, exist_ok=True)
+        dist = np.asarray(dist, dtype=np.float64)
+        coords = np.stack((xTot, yTot)).astype(np.float64)
+        entry = self.index['instances'].get(self.key(p, i))
+        if entry is not None:
+            with open(self.dataPath, 'r+b') as fout:
+                self.overwrite(fout, dist, entry['dist'])
+                self.overwrite(fout, coords, entry['coords'])
+            entry['zeroHoleID'] = int(zeroHoleID)
+        else:
+            with open(self.dataPath, 'ab') as fout:
+                fout.seek(0, os.SEEK_END)
+                entry = {
+                    'points': int(p),
+                    'id': int(i),
+                    'zeroHoleID': int(zeroHoleID),
+                    'dist': self.append(fout, dist),
+                    'coords': self.append(fout, coords)
+                }
+            self.index['instances'][self.key(p, i)] = entry
+        # the index is replaced atomically, readers never see a partially written index
+        with open(self.indexPath+'.tmp', 'wt') as fout:
+            json.dump(self.index, fout)
+        os.replace(self.indexPath+'.tmp', self.indexPath)
+        self.data = None
+
+    def view(self, array):
+        if self.data is None:
+            self.data = np.memmap(self.dataPath, dtype=np.uint8, mode='r')
+        dtype = np.dtype(array['dtype'])
+        nbytes = int(np.prod(array['shape']))*dtype.itemsize
+        return self.data[array['offset']:array['offset']+nbytes].view(dtype).reshape(array['shape'])
+
+    # Same arrays returned by loadInstance, plus the zeroHoleID used by OPL
+    def load(self, p, i):
+        entry = self.index['instances'][self.key(p, i)]
+        xTot, yTot = self.view(entry['coords'])
+        return {'dist': self.view(entry['dist']), 'xTot': xTot, 'yTot': yTot, 'zeroHoleID': entry['zeroHoleID']}
+
+    # Write the OPL data file of an instance, same format written by 001-generate-points.py
+    def writeDat(self, p, i, path):
+        instance = self.load(p, i)
+        with open(path, 'w') as datFile:
+            datFile.write('totalHoles = {};\n'.format(len(instance['xTot'])))
+            datFile.write('zeroHoleID = {};\n'.format(instance['zeroHoleID']))
+            datFile.write('C = {};'.format(json.dumps(instance['dist'].tolist())))
+
+# zeroHoleID stored in an OPL data file
+def readZeroHoleID(datPath):
+    with open(datPath) as fin:
+        return int(re.search(r'zeroHoleID = (\d+);', fin.read(200)).group(1))
+
+# cache and store used by default in each process
+instanceCache = InstanceCache()
+instanceStore = InstanceStore()
+DEFAULT_POINTS_DIR = './points/'
+
+# Store of the instances of pointsDir: the default store holds the instances of the default points folder,
+# the instances of other folders are read from their files (unless a store is given)
+def pointsStore(pointsDir, store=None):
+    if store is not None:
+        return store
+    if os.path.abspath(pointsDir) == os.path.abspath(DEFAULT_POINTS_DIR):
+        return instanceStore
+    return None
+
+def instancePath(p, i, pointsDir='./points/'):
+    return os.path.join(pointsDir, str(p), '{}.npz'.format(i))
+
+# Returns the points folders and, for each one, the ids of the point distributions found in it
+def listInstanceFiles(pointsDir='./points/'):
+    for (dirpath, dirnames, filenames) in walk(pointsDir):
+        points = sorted([int(d) for d in dirnames if not d.startswith('.ipynb')])
+        break
+    instances = {}
+    for p in points:
+        files = [file for file in listdir(os.path.join(pointsDir, str(p))) if file.endswith('.dat')]
+        instances[p] = list(range(1, len(files)+1))
+    return instances
+
+# Same as listInstanceFiles, the instances are listed from the instance store when it exists
+def listInstances(pointsDir='./points/', store=None):
+    store = pointsStore(pointsDir, store)
+    if store is not None and store.exists():
+        return store.instances()
+    return listInstanceFiles(pointsDir)
+
+# zeroHoleID (1-based, as in the .dat files) of the point distribution i with p points
+def loadZeroHoleID(p, i, pointsDir='./points/', store=None):
+    store = pointsStore(pointsDir, store)
+    if store is not None and (p, i) in store:
+        return store.index['instances'][store.key(p, i)]['zeroHoleID']
+    return readZeroHoleID(os.path.join(pointsDir, str(p), '{}.dat'.format(i)))
+
+# Returns the arrays of the point distribution i with p points: dist (distance matrix), xTot and yTot (coordinates)
+def loadInstance(p, i, pointsDir='./points/', cache=None, store=None):
+    store = pointsStore(pointsDir, store)
+    if store is not None and (p, i) in store:
+        return store.load(p, i)
+    cache = instanceCache if cache is None else cache
+    return cache.load(instancePath(p, i, pointsDir))
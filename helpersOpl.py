@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import OPL_BINARY, OPL_MODEL, OPL_WATCHDOG_MARGIN
+from helpersInstances import readZeroHoleID
+from helpersSolutions import solutionStore, readFlowMatrix, flowToTour
+
+# Runner of the OPL solver (oplrun) for 002-optimize.py.
+# Every solve runs a copy of the model in its own scratch directory: OPL writes the export.txt file of hw1.mod next to
+# the model file, so the copies do not collide and several solves can run at the same time. oplrun is an external
+# process, so the solves are launched from a thread pool: threads only wait for their process to finish.
+# opl-model/fake-oplrun.py stands in for oplrun where OPL is not installed (see 016-check-opl-runner.py).
+
+########################
+### SINGLE OPL SOLVE ###
+########################
+# Run oplrun on one point distribution with the given time limit. The raw output is stored in the points folder as
+# {i}_{timeLimit}_output.txt, the solution is converted to a tour and added to the solution store (solver 'opl').
+# Returns None if the problem was solved, otherwise the record of the unsolvable problem
+def runOplJob(p, i, timeLimit, pointsDir='./points/', oplBinary=OPL_BINARY, modelPath=OPL_MODEL,
+              watchdogMargin=OPL_WATCHDOG_MARGIN, solutions=None):
+    solutions = solutionStore if solutions is None else solutions
+    folder = os.path.join(pointsDir, str(p))
+    datPath = os.path.abspath(os.path.join(folder, '{}.dat'.format(i)))
+    # cplex.tilim is not always respected (e.g. while loading the model), the process is killed after the margin
+    watchdog = None if timeLimit == 9999 else timeLimit+watchdogMargin
+    record = {'points': p, 'distribution': i, 'timeLimit': timeLimit}
+    scratchDir = tempfile.mkdtemp(prefix='opl-{}-{}-{}-'.format(p, i, timeLimit))
+    try:
+        scratchModel = shutil.copy(modelPath, scratchDir)
+        command = [oplBinary, '-v', '-D', 'timeLimit={}'.format(timeLimit), scratchModel, datPath]
+        rawOutput = subprocess.run(command, cwd=scratchDir, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   timeout=watchdog, check=True).stdout.decode('UTF-8')
+        # save the solution (output from OPL in file export.txt) regarding the best route
+        flow = readFlowMatrix(os.path.join(scratchDir, 'export.txt'))
+        solutions.add(p, i, timeLimit, 'opl', flowToTour(flow, readZeroHoleID(datPath)))
+    except subprocess.CalledProcessError as e:
+        # exception is thrown if OPL cannot find a feasible solution with this time limit
+        return dict(record, reason='no feasible solution', returncode=e.returncode,
+                    stderr=e.stderr.decode('UTF-8', 'replace')[-1000:])
+    except subprocess.TimeoutExpired:
+        return dict(record, reason='watchdog timeout', returncode=None, stderr='')
+    except FileNotFoundError as e:
+        # missing export.txt (or missing oplrun binary)
+        return dict(record, reason='missing file: {}'.format(e.filename), returncode=None, stderr='')
+    except (ValueError, AttributeError) as e:
+        # truncated or malformed export.txt, or .dat file without zeroHoleID
+        return dict(record, reason='invalid output: {}'.format(e), returncode=None, stderr='')
+    finally:
+        shutil.rmtree(scratchDir, ignore_errors=True)
+    # store current raw output to file for later analysis
+    with open(os.path.join(folder, '{}_{}_output.txt'.format(i, timeLimit)), "wt") as fout:
+        fout.write(rawOutput)
+    return None
+
+#################
+### OPL BATCH ###
+#################
+# Run all the (points, distribution, time limit) jobs with at most workers solves at the same time.
+# Returns the records of the unsolvable problems, ordered as the jobs
+def runOplBatch(jobs, workers=None, pointsDir='./points/', oplBinary=OPL_BINARY, modelPath=OPL_MODEL,
+                watchdogMargin=OPL_WATCHDOG_MARGIN, solutions=None):
+    workers = workers or os.cpu_count()
+    unsolvables = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(runOplJob, p, i, timeLimit, pointsDir, oplBinary, modelPath, watchdogMargin,
+                                   solutions): nr
+                   for nr, (p, i, timeLimit) in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures)):
+            record = future.result()
+            p, i, timeLimit = jobs[futures[future]]
+            if record is None:
+                print('Completed job {}/{}: points/{}/{}.dat with time limit {}s'.format(done+1, len(jobs), p, i, timeLimit))
+            else:
+                unsolvables[futures[future]] = record
+                print('  × points/{}/{}.dat with time limit {}s is unsolvable ({})'.format(p, i, timeLimit, record['reason']))
+    return [unsolvables[nr] for nr in sorted(unsolvables)]
+
+# unsolvables.json format: points -> time limit -> list of the unsolvable distributions
+def groupUnsolvables(records):
+    unsolvables = {}
+    for record in records:
+        unsolvables.setdefault(record['points'], {})
+        unsolvables[record['points']].setdefault(record['timeLimit'], [])
+        unsolvables[record['points']][record['timeLimit']].append(record['distribution'])
+    return unsolvables
@@ -0,0 +1,125 @@
+import os
+import json
+import time
+
+# Instrumentation of the genetic algorithm (eaSimple, eaSimpleArray).
+# The loops time their phases (selection, variation, evaluation, local search, hall of fame, statistics, migration)
+# and count their operations (evaluations, crossovers, mutations, ...) through a profiler. At the end of every
+# generation the times [ms] and counters are added to the logbook record as time[phase] and count[counter] fields.
+# The default profiler does nothing (NullProfiler), so the loops pay a few no-op calls per generation when
+# profiling is off. Phases can be nested (e.g. the history updates run during the variation), the time of a nested
+# phase is also part of the time of the outer one.
+
+#####################
+### NULL PROFILER ###
+#####################
+class NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_PHASE = NullPhase()
+
+class NullProfiler:
+    enabled = False
+
+    def phase(self, name):
+        return NULL_PHASE
+
+    def count(self, name, value=1):
+        pass
+
+    # functions are returned as they are, no wrapper is added
+    def timed(self, name, func):
+        return func
+
+    def endGeneration(self, gen):
+        return {}
+
+NULL_PROFILER = NullProfiler()
+
+######################
+### PHASE PROFILER ###
+######################
+class Phase:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.addTime(self.name, self.start, time.perf_counter())
+        return False
+
+# Profiler recording the phase times and counters of every generation (records, one dictionary per generation).
+# With trace every single phase is also kept as an event, to be exported as Chrome trace
+class PhaseProfiler:
+    enabled = True
+
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.times = {}
+        self.counters = {}
+        self.records = []
+        self.events = []
+        self.gen = 0
+        self.origin = time.perf_counter()
+
+    def phase(self, name):
+        return Phase(self, name)
+
+    def addTime(self, name, start, end):
+        self.times[name] = self.times.get(name, 0.0) + end-start
+        if self.trace:
+            self.events.append((name, start-self.origin, end-start, self.gen))
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    # Wrap func so that every call is timed as the given phase (e.g. the history.update bookkeeping)
+    def timed(self, name, func):
+        def timedFunc(*args, **kargs):
+            with self.phase(name):
+                return func(*args, **kargs)
+        return timedFunc
+
+    # Close the current generation, returns the fields added to its logbook record
+    def endGeneration(self, gen):
+        record = {'time[{}]'.format(name): value*1000 for name, value in self.times.items()}
+        record.update({'count[{}]'.format(name): value for name, value in self.counters.items()})
+        self.records.append(dict(gen=gen, **record))
+        self.times = {}
+        self.counters = {}
+        self.gen = gen+1
+        return record
+
+    # Per generation records as JSON lines, one line per generation
+    def exportJsonLines(self, path):
+        with open(path, 'wt') as fout:
+            for record in self.records:
+                fout.write(json.dumps(record)+'\n')
+
+    # Trace events in the Chrome trace format (chrome://tracing, Perfetto): one complete event per phase and one
+    # counter event per generation
+    def exportChromeTrace(self, path):
+        pid = os.getpid()
+        events = [{'name': name, 'ph': 'X', 'ts': start*1e6, 'dur': duration*1e6, 'pid': pid, 'tid': 0,
+                   'args': {'gen': gen}} for name, start, duration, gen in self.events]
+        # counters are placed at the end of the last phase of their generation
+        ends = {}
+        for name, start, duration, gen in self.events:
+            ends[gen] = max(ends.get(gen, 0.0), start+duration)
+        for record in self.records:
+            counters = {name[6:-1]: value for name, value in record.items() if name.startswith('count[')}
+            if counters and record['gen'] in ends:
+                events.append({'name': 'counters', 'ph': 'C', 'ts': ends[record['gen']]*1e6, 'pid': pid,
+                               'args': counters})
+        with open(path, 'wt') as fout:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fout)
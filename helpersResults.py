@@ -0,0 +1,163 @@
+import os
+import re
+import csv
+import json
+import numpy as np
+
+# Extraction of the OPL results (*_output.txt files written by 002-optimize.py) and results table.
+# Parsed output files are kept in an index together with their modification time and size, so that running the
+# extraction again only parses the new or changed files. Distances from the optimum are computed against an explicit
+# lookup of the optimal value of every point distribution, whatever the order the files are parsed in.
+
+OUTPUT_FILE = re.compile(r'^(\d+)_([\d.]+)_output\.txt$')
+OPTIMAL_SOLUTIONS = ['optimal', 'integer optimal, tolerance']
+TABLE_COLUMNS = ['instance', 'size', 'timeLimit', 'solver', 'objective', 'time[ms]', 'gap[%]']
+
+##########################
+### OPL OUTPUT PARSING ###
+##########################
+# Read the solving time, objective and solution type from an OPL output, line by line.
+# Returns None if the output is incomplete
+def parseOplOutput(path):
+    runningTime, objFunValue, solutionType = None, None, None
+    with open(path, 'r') as fin:
+        for line in fin:
+            if runningTime is None and line.startswith('solving time ~= '):
+                runningTime = round(float(line[len('solving time ~= '):].strip().rstrip('.')), 1)
+            # objective and solution type are on the same line (// solution (optimal) with objective ...)
+            if objFunValue is None and 'with objective ' in line:
+                objFunValue = float(line.split('with objective ', 1)[1].strip())
+            if solutionType is None and '// solution (' in line:
+                solutionType = re.search(r'// solution \((.*)\)', line).group(1)
+    if runningTime is None or objFunValue is None or solutionType is None:
+        return None
+    return {
+        'runningTime[ms]': runningTime,
+        'objFunValue': objFunValue,
+        'optimal': solutionType in OPTIMAL_SOLUTIONS
+    }
+
+# Update the index of the parsed output files: only new or changed files (modification time or size) are parsed,
+# entries of deleted files are removed. Returns the index, path -> file signature and parsed result
+def updateIndex(pointsDir='./points/', indexPath='results_index.json'):
+    index = {}
+    if os.path.exists(indexPath):
+        with open(indexPath) as fin:
+            index = json.load(fin)
+    updated = {}
+    parsed = 0
+    for p in sorted(os.listdir(pointsDir)):
+        folder = os.path.join(pointsDir, p)
+        if not p.isdigit() or not os.path.isdir(folder):
+            continue
+        for file in sorted(os.listdir(folder)):
+            match = OUTPUT_FILE.match(file)
+            if match is None:
+                continue
+            path = os.path.join(folder, file)
+            stat = os.stat(path)
+            entry = index.get(path)
+            if entry is None or entry['mtime'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+                entry = {
+                    'mtime': stat.st_mtime_ns,
+                    'size': stat.st_size,
+                    'points': p,
+                    'distribution': match.group(1),
+                    'timeLimit': match.group(2),
+                    'result': parseOplOutput(path)
+                }
+                parsed += 1
+            updated[path] = entry
+    # the index is replaced atomically, an interrupted extraction keeps the previous index
+    with open(indexPath+'.tmp', 'wt') as fout:
+        json.dump(updated, fout)
+    os.replace(indexPath+'.tmp', indexPath)
+    print('{} output files indexed, {} parsed'.format(len(updated), parsed))
+    return updated
+
+#########################
+### OPTIMAL REFERENCE ###
+#########################
+# Optimal value of every point distribution, (points, distribution) -> objective value.
+# Taken from the OPL runs that proved optimality (the best one, if more than one), then from the optimal solutions
+# of the other exact solvers (results with status optimal, e.g. results_exact.json) for the missing distributions
+def optimalReference(index, exactResults=None):
+    reference = {}
+    for entry in index.values():
+        result = entry['result']
+        if result is not None and result['optimal']:
+            key = (entry['points'], entry['distribution'])
+            reference[key] = min(reference.get(key, np.inf), result['objFunValue'])
+    for p, distributions in (exactResults or {}).items():
+        for i, timeLimits in distributions.items():
+            for result in timeLimits.values():
+                if result.get('status') == 'optimal' and (p, i) not in reference:
+                    reference[(p, i)] = result['objFunValue']
+    return reference
+
+def deltaFromOptimal(objFunValue, p, i, reference):
+    optimalFunValue = reference.get((str(p), str(i)))
+    if optimalFunValue is None:
+        return None
+    return (objFunValue/optimalFunValue-1)*100
+
+# Build the results.json dictionary (points -> distribution -> time limit) from the index
+def buildResults(index, reference):
+    optimResults = {}
+    for entry in index.values():
+        result = entry['result']
+        if result is None:
+            continue
+        p, i = entry['points'], entry['distribution']
+        optimResults.setdefault(p, {})
+        optimResults[p].setdefault(i, {})
+        optimResults[p][i][entry['timeLimit']] = {
+            'runningTime[ms]': result['runningTime[ms]'],
+            'deltaFromOpt[%]': deltaFromOptimal(result['objFunValue'], p, i, reference),
+            'objFunValue': result['objFunValue']
+        }
+    return optimResults
+
+#####################
+### RESULTS TABLE ###
+#####################
+# Flat table with one row per (solver, points, distribution, time limit), built from results files with the format
+# of results.json (results.json, results_genetic.json, ...). Gaps are computed again against the optimal reference
+def resultsTableRows(results, solver, reference):
+    rows = []
+    for p, distributions in results.items():
+        for i, timeLimits in distributions.items():
+            for timeLimit, result in timeLimits.items():
+                rows.append({
+                    'instance': int(i),
+                    'size': int(p),
+                    'timeLimit': float(timeLimit),
+                    'solver': solver,
+                    'objective': result['objFunValue'],
+                    'time[ms]': result['runningTime[ms]'],
+                    'gap[%]': deltaFromOptimal(result['objFunValue'], p, i, reference)
+                })
+    return rows
+
+def writeResultsTable(rows, path='results_table.csv'):
+    rows = sorted(rows, key=lambda row: (row['solver'], row['size'], row['instance'], row['timeLimit']))
+    with open(path, 'wt', newline='') as fout:
+        writer = csv.DictWriter(fout, fieldnames=TABLE_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({column: '' if row[column] is None else row[column] for column in TABLE_COLUMNS})
+
+# Load the results table as columns (column name -> numpy array), missing gaps are nan
+def loadResultsTable(path='results_table.csv'):
+    with open(path, 'rt', newline='') as fin:
+        rows = list(csv.DictReader(fin))
+    table = {}
+    for column in TABLE_COLUMNS:
+        values = [row[column] for row in rows]
+        if column == 'solver':
+            table[column] = np.array(values)
+        elif column in ['instance', 'size']:
+            table[column] = np.array(values, dtype=int)
+        else:
+            table[column] = np.array([np.nan if value == '' else float(value) for value in values])
+    return table
@@ -0,0 +1,206 @@
+import numpy as np
+from helpersGeneticAlgo import pastDeadline
+
+# Construction heuristics seeding the initial population of the genetic algorithm (geneticModel(..., seedFraction=...)).
+# A random tour is far from a good one, so with short time limits most of the budget would be spent improving random
+# tours: a share of the population is built instead with fast constructive heuristics.
+# - nearestNeighbor: from a random start, always moves to the closest node not visited yet
+# - greedyEdge: adds the shortest edges first, skipping those giving a node three edges or closing a subtour
+# - spaceFillingCurve: visits the points in the order of a Hilbert curve over their coordinates (xTot, yTot)
+# Candidate edges are read from the neighbor lists (nearestNeighbors in helpersGeneticAlgo.py), so the construction
+# does not scan the whole distance matrix. distances is the distance matrix or any other distance backend.
+# Every seed is randomized (random start, noisy edge lengths, random rotation and shift of the curve), so that the
+# seeds are different tours and the population keeps its diversity.
+# With a deadline (time.perf_counter clock, see deadlineAfter) the constructions check the time every SEED_CHECK_EVERY
+# steps: a construction interrupted at the deadline appends the nodes (or fragments) left in id order, so it still
+# returns a complete tour.
+
+SEEDING_METHODS = ['nearestNeighbor', 'greedyEdge', 'spaceFillingCurve']
+# size of the neighbor lists used as candidate edges
+SEED_NEIGHBORS = 10
+# relative noise added to the edge lengths of the greedy matching (all the seeds but the first one)
+GREEDY_NOISE = 0.1
+# bits per coordinate of the Hilbert curve
+HILBERT_ORDER = 16
+# nodes visited or edges scanned between two deadline checks
+SEED_CHECK_EVERY = 256
+# share of the time limit available to the seeding, the rest is left to the generations
+SEED_TIME_SHARE = 0.5
+
+########################
+### NEAREST NEIGHBOR ###
+########################
+# Distances from node to all the nodes, as a float array
+def distanceRow(distances, node):
+    return np.array(distances[np.array([node])][0], dtype=float)
+
+def nearestNeighborTour(distances, neighbors, start, deadline=None):
+    size = len(neighbors)
+    visited = np.zeros(size, dtype=bool)
+    visited[start] = True
+    tour = [start]
+    current = start
+    for step in range(size-1):
+        if deadline is not None and step % SEED_CHECK_EVERY == 0 and pastDeadline(deadline):
+            tour += np.flatnonzero(~visited).tolist()
+            break
+        nextNode = None
+        for candidate in neighbors[current]:
+            if not visited[candidate]:
+                nextNode = candidate
+                break
+        # all the candidates were visited, the closest node is searched on the whole row
+        if nextNode is None:
+            row = distanceRow(distances, current)
+            row[visited] = np.inf
+            nextNode = int(np.argmin(row))
+        visited[nextNode] = True
+        tour.append(nextNode)
+        current = nextNode
+    return tour
+
+###################
+### GREEDY EDGE ###
+###################
+# Candidate edges (a < b) of the neighbor lists, each edge once
+def candidateEdges(neighbors):
+    closest = np.asarray(neighbors, dtype=np.int64)
+    size = len(closest)
+    a = np.repeat(np.arange(size), closest.shape[1])
+    b = closest.ravel()
+    # edges are encoded as a single integer, much faster to deduplicate than the rows of an array
+    edges = np.unique(np.minimum(a, b)*size + np.maximum(a, b))
+    return edges // size, edges % size
+
+def greedyEdgeTour(distances, neighbors, noise=0.0, deadline=None):
+    size = len(neighbors)
+    a, b = candidateEdges(neighbors)
+    lengths = np.asarray(distances[a, b], dtype=float)
+    if noise > 0:
+        lengths = lengths*(1+noise*np.random.random(len(lengths)))
+    order = np.argsort(lengths, kind='stable')
+    # fragments are paths: nodes have at most two edges and the union-find forbids closing a cycle
+    degree = [0]*size
+    parent = list(range(size))
+    adjacent = [[] for _ in range(size)]
+    links = 0
+    for nr, (u, v) in enumerate(zip(a[order].tolist(), b[order].tolist())):
+        if deadline is not None and nr % SEED_CHECK_EVERY == 0 and pastDeadline(deadline):
+            break
+        if degree[u] == 2 or degree[v] == 2:
+            continue
+        ru, rv = u, v
+        while parent[ru] != ru:
+            parent[ru] = parent[parent[ru]]
+            ru = parent[ru]
+        while parent[rv] != rv:
+            parent[rv] = parent[parent[rv]]
+            rv = parent[rv]
+        if ru == rv:
+            continue
+        parent[ru] = rv
+        degree[u] += 1
+        degree[v] += 1
+        adjacent[u].append(v)
+        adjacent[v].append(u)
+        links += 1
+        if links == size-1:
+            break
+    return joinFragments(distances, fragmentPaths(adjacent, degree), deadline)
+
+# Node sequences of the path fragments, walked from one of their endpoints (single nodes are fragments too)
+def fragmentPaths(adjacent, degree):
+    visited = [False]*len(adjacent)
+    paths = []
+    for node in range(len(adjacent)):
+        if visited[node] or degree[node] == 2:
+            continue
+        path = [node]
+        visited[node] = True
+        previous, current = None, node
+        while True:
+            following = [n for n in adjacent[current] if n != previous]
+            if not following:
+                break
+            previous, current = current, following[0]
+            visited[current] = True
+            path.append(current)
+        paths.append(path)
+    return paths
+
+# Joins the fragments into a tour: the fragment with the endpoint closest to the end of the tour is appended next
+# (reversed if its closest endpoint is its last node)
+def joinFragments(distances, paths, deadline=None):
+    tour = list(paths[0])
+    left = paths[1:]
+    while left:
+        # every join scans all the fragments left, so the deadline is checked at every join
+        if pastDeadline(deadline):
+            tour += [node for path in left for node in path]
+            break
+        ends = np.array([path[0] for path in left]+[path[-1] for path in left])
+        closest = int(np.argmin(np.asarray(distances[np.full(len(ends), tour[-1]), ends], dtype=float)))
+        path = left.pop(closest % len(left))
+        tour += path if closest < len(ends)//2 else path[::-1]
+    return tour
+
+###########################
+### SPACE FILLING CURVE ###
+###########################
+# Position of the integer points (x, y) on the Hilbert curve of the given order (2^order x 2^order grid)
+def hilbertIndex(x, y, order=HILBERT_ORDER):
+    x = np.asarray(x, dtype=np.int64)
+    y = np.asarray(y, dtype=np.int64)
+    last = (1 << order)-1
+    index = np.zeros(len(x), dtype=np.int64)
+    s = 1 << (order-1)
+    while s > 0:
+        rx = ((x & s) > 0).astype(np.int64)
+        ry = ((y & s) > 0).astype(np.int64)
+        index += s*s*((3*rx) ^ ry)
+        # rotate the quadrant so that the curve of the next level is in the standard orientation
+        flip = (ry == 0) & (rx == 1)
+        x = np.where(flip, last-x, x)
+        y = np.where(flip, last-y, y)
+        x, y = np.where(ry == 0, y, x), np.where(ry == 0, x, y)
+        s >>= 1
+    return index
+
+# Points sorted along a Hilbert curve. With randomize the points are rotated and placed at a random offset
+# in a grid of twice their size, so that every seed follows a different curve
+def hilbertTour(xTot, yTot, randomize=False, order=HILBERT_ORDER):
+    x = np.asarray(xTot, dtype=float)
+    y = np.asarray(yTot, dtype=float)
+    cells = (1 << order)-1
+    offset = (0.0, 0.0)
+    if randomize:
+        angle = np.random.uniform(0, 2*np.pi)
+        x, y = x*np.cos(angle)-y*np.sin(angle), x*np.sin(angle)+y*np.cos(angle)
+        cells = cells//2
+        offset = np.random.uniform(0, cells, size=2)
+    scale = cells/max(np.ptp(x), np.ptp(y), np.finfo(float).tiny)
+    index = hilbertIndex(np.floor((x-x.min())*scale+offset[0]), np.floor((y-y.min())*scale+offset[1]), order)
+    return np.argsort(index, kind='stable').tolist()
+
+#############
+### SEEDS ###
+#############
+# Endless sequence of seed tours (lists of node ids), one method after the other. The first tour of each method is
+# its deterministic version (start from node 0, no noise, no rotation), the following ones are randomized.
+# The space filling curve is skipped without coordinates
+def seedTours(distances, neighbors, xTot=None, yTot=None, methods=None, deadline=None):
+    methods = SEEDING_METHODS if methods is None else methods
+    methods = [method for method in methods if method != 'spaceFillingCurve' or xTot is not None]
+    size = len(neighbors)
+    built = 0
+    while methods:
+        for method in methods:
+            if method == 'nearestNeighbor':
+                yield nearestNeighborTour(distances, neighbors, 0 if built == 0 else np.random.randint(size), deadline)
+            elif method == 'greedyEdge':
+                yield greedyEdgeTour(distances, neighbors, 0.0 if built == 0 else GREEDY_NOISE, deadline)
+            elif method == 'spaceFillingCurve':
+                yield hilbertTour(xTot, yTot, randomize=built > 0)
+            else:
+                raise ValueError('Unknown seeding method {}'.format(method))
+        built += 1
@@ -0,0 +1,125 @@
+import os
+import hashlib
+import numpy as np
+
+# Cache of the best tours found for every instance, shared by the runs of the solvers and by the processes, used to
+# warm start the genetic algorithm (geneticModel(..., cache=solutionCache)): the cached tours are injected in the
+# initial population and the best tour found is added back at the end of the solve.
+# Instances are identified by their fingerprint, a hash of their content (distance matrix or coordinates), so the
+# same instance hits the same entry whatever file or store it was loaded from.
+# Every instance is a file of the cache folder (npz with the best distinct tours and their lengths), written
+# atomically. The size of the folder is bounded: the least recently used entries are evicted (reading an entry
+# updates its modification time).
+
+# tours kept for every instance
+CACHE_ELITES = 5
+# maximum size of the cache folder
+CACHE_MAX_BYTES = 64*2**20
+
+###################
+### FINGERPRINT ###
+###################
+# Hash of the content of an instance: the distance matrix, or the coordinates of a CoordinateDistance backend
+# (see helpersDistance.py). Other backends are hashed on their dense rows
+def instanceFingerprint(distanceMatrix):
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(distanceMatrix, np.ndarray):
+        digest.update(b'matrix')
+        values = np.ascontiguousarray(distanceMatrix, dtype=np.float64)
+    elif hasattr(distanceMatrix, 'x') and hasattr(distanceMatrix, 'y'):
+        digest.update(b'coordinates')
+        values = np.stack((distanceMatrix.x, distanceMatrix.y), axis=-1).astype(np.float64)
+    else:
+        digest.update(b'matrix')
+        values = np.ascontiguousarray(distanceMatrix[np.arange(len(distanceMatrix))], dtype=np.float64)
+    digest.update(np.asarray(values.shape, dtype=np.int64).tobytes())
+    digest.update(values.tobytes())
+    return digest.hexdigest()
+
+# Same cycle starting from node 0 and followed towards its smaller neighbor, so that duplicated tours are recognized
+def canonicalTour(tour):
+    tour = np.asarray(tour, dtype=np.int64)
+    tour = np.roll(tour, -int(np.flatnonzero(tour == 0)[0]))
+    if len(tour) > 2 and tour[-1] < tour[1]:
+        tour = np.concatenate((tour[:1], tour[:0:-1]))
+    return tour
+
+######################
+### SOLUTION CACHE ###
+######################
+class SolutionCache:
+    def __init__(self, path='./solution_cache', maxBytes=CACHE_MAX_BYTES, elites=CACHE_ELITES):
+        self.path = path
+        self.maxBytes = maxBytes
+        self.elites = elites
+
+    def entryPath(self, fingerprint):
+        return os.path.join(self.path, '{}.npz'.format(fingerprint))
+
+    def __contains__(self, fingerprint):
+        return os.path.exists(self.entryPath(fingerprint))
+
+    # Cached tours (matrix, one tour per row) and their lengths, sorted from the shortest. None if not cached
+    def get(self, fingerprint):
+        path = self.entryPath(fingerprint)
+        try:
+            with np.load(path) as npzfile:
+                tours, lengths = npzfile['tours'], npzfile['lengths']
+            os.utime(path)
+        except FileNotFoundError:
+            # not cached, or evicted by another process
+            return None
+        return tours.astype(np.int64), lengths
+
+    # Merge the tours into the entry of the instance, keeping the best distinct ones.
+    # Returns True if the entry changed
+    def add(self, fingerprint, tours, lengths):
+        entries = {}
+        cached = self.get(fingerprint)
+        if cached is not None:
+            for tour, length in zip(*cached):
+                entries[tour.tobytes()] = (float(length), tour)
+        for tour, length in zip(tours, lengths):
+            tour = canonicalTour(tour)
+            entries.setdefault(tour.tobytes(), (float(length), tour))
+        best = sorted(entries.values(), key=lambda entry: entry[0])[:self.elites]
+        if cached is not None and np.array_equal(cached[1], [length for length, _ in best]):
+            return False
+        os.makedirs(self.path, exist_ok=True)
+        path = self.entryPath(fingerprint)
+        tmpPath = '{}.{}.tmp'.format(path, os.getpid())
+        size = len(best[0][1])
+        dtype = np.uint8 if size <= 2**8 else np.uint16 if size <= 2**16 else np.uint32
+        with open(tmpPath, 'wb') as fout:
+            np.savez(fout, tours=np.array([tour for _, tour in best], dtype=dtype),
+                     lengths=np.array([length for length, _ in best]))
+        os.replace(tmpPath, path)
+        self.evict(keep=path)
+        return True
+
+    # Remove the least recently used entries until the folder fits in maxBytes (the entry keep is never removed)
+    def evict(self, keep=None):
+        entries = []
+        for file in os.listdir(self.path):
+            path = os.path.join(self.path, file)
+            if not file.endswith('.npz'):
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.maxBytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+# cache used by default in each process
+solutionCache = SolutionCache()
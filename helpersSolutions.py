@@ -0,0 +1,114 @@
+import os
+import struct
+import numpy as np
+
+# Solutions (tours) of all the solvers in a single store.
+# A tour is the permutation of the 0-based ids of the points, starting from the zero hole of the instance, so tours of
+# different solvers can be compared directly. OPL solutions (flow matrix x of hw1.mod) are converted to tours
+# following the successors of every hole from the zero hole.
+
+####################
+### FLOW TO TOUR ###
+####################
+# Read the flow matrix written by hw1.mod, both export.txt ([[...] [...]]) and *_sol.txt (one row per line)
+def readFlowMatrix(path):
+    with open(path, 'rt') as fin:
+        values = np.array(fin.read().replace('[', ' ').replace(']', ' ').split(), dtype=np.int64)
+    size = int(round(np.sqrt(len(values))))
+    if size*size != len(values):
+        raise ValueError('{} does not contain a square flow matrix'.format(path))
+    return values.reshape(size, size)
+
+# Tour of an OPL solution: every hole has a single outgoing edge with positive flow (y is an assignment),
+# the tour follows the successors starting from the zero hole (zeroHoleID is 1-based, as in the .dat files)
+def flowToTour(flow, zeroHoleID):
+    flow = np.asarray(flow)
+    successors = np.argmax(flow > 0, axis=1)
+    tour = [zeroHoleID-1]
+    for _ in range(len(flow)-1):
+        tour.append(int(successors[tour[-1]]))
+    if len(set(tour)) != len(flow):
+        raise ValueError('The flow matrix does not describe a single tour')
+    return np.array(tour)
+
+# Same tour starting from the zero hole
+def rotateTour(tour, zeroHoleID):
+    tour = np.asarray(tour)
+    return np.roll(tour, -int(np.flatnonzero(tour == zeroHoleID-1)[0]))
+
+######################
+### SOLUTION STORE ###
+######################
+# Single append-only binary file with one record per (points, distribution, time limit, solver): a fixed size
+# header followed by the tour, stored with the smallest unsigned type holding the ids of the points (uint8 up to
+# 256 points, uint16 up to 65536). A record added again for the same key replaces the previous one.
+# Records are written with a single append, so several processes can add solutions to the same store, and every
+# store reads the records appended by the others on the next lookup.
+class SolutionStore:
+    MAGIC = b'TOUR'
+    # magic, points, distribution, time limit, solver, bytes per id, number of points
+    HEADER = struct.Struct('<4sIId16sBI')
+
+    def __init__(self, path='./solutions.bin'):
+        self.path = path
+        self.data = bytearray()
+        self.index = {}
+
+    def key(self, p, i, timeLimit, solver):
+        return int(p), int(i), float(timeLimit), solver
+
+    # Read the records appended since the last refresh
+    def refresh(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == len(self.data):
+            return
+        with open(self.path, 'rb') as fin:
+            fin.seek(len(self.data))
+            tail = fin.read()
+        offset = len(self.data)
+        self.data += tail
+        while offset+self.HEADER.size <= len(self.data):
+            magic, p, i, timeLimit, solver, itemSize, size = self.HEADER.unpack_from(self.data, offset)
+            if magic != self.MAGIC:
+                raise ValueError('{} is corrupted at byte {}'.format(self.path, offset))
+            end = offset+self.HEADER.size+itemSize*size
+            # record still being written
+            if end > len(self.data):
+                break
+            key = self.key(p, i, timeLimit, solver.rstrip(b'\0').decode('ascii'))
+            self.index[key] = (offset+self.HEADER.size, itemSize, size)
+            offset = end
+        # an incomplete record is read again on the next refresh
+        del self.data[offset:]
+
+    def add(self, p, i, timeLimit, solver, tour):
+        tour = np.asarray(tour)
+        dtype = np.uint8 if len(tour) <= 2**8 else np.uint16 if len(tour) <= 2**16 else np.uint32
+        header = self.HEADER.pack(self.MAGIC, int(p), int(i), float(timeLimit), solver.encode('ascii'),
+                                  np.dtype(dtype).itemsize, len(tour))
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, header + tour.astype(dtype).tobytes())
+        finally:
+            os.close(fd)
+
+    def __contains__(self, key):
+        self.refresh()
+        return self.key(*key) in self.index
+
+    # Keys (points, distribution, time limit, solver) of all the solutions
+    def keys(self):
+        self.refresh()
+        return sorted(self.index)
+
+    # Tour of a solution, None if the solution is not in the store
+    def get(self, p, i, timeLimit, solver):
+        self.refresh()
+        entry = self.index.get(self.key(p, i, timeLimit, solver))
+        if entry is None:
+            return None
+        offset, itemSize, size = entry
+        dtype = {1: np.uint8, 2: np.uint16, 4: np.uint32}[itemSize]
+        return np.frombuffer(self.data, dtype=dtype, count=size, offset=offset).astype(np.int64)
+
+# store used by default in each process
+solutionStore = SolutionStore()
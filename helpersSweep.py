@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import random
+import numpy as np
+from genetic_model import geneticModel
+from decomposition_model import decompositionModel
+from helpersInstances import loadInstance, loadZeroHoleID
+from helpersGeneticAlgo import evalTSP, deadlineAfter, pastDeadline, remainingTime, overshoot
+from helpersSolutions import solutionStore, rotateTour
+from helpersSolutionCache import solutionCache, instanceFingerprint
+from config import GENETIC_ALGO_LOOPS
+
+# Helpers to run the genetic algorithm sweep of 006-optimize-genetic.py as independent jobs,
+# one job for each (points folder, point distribution, time limit)
+
+#######################
+### JOBS DEFINITION ###
+#######################
+# Key used to identify a job in results_genetic.json and in the checkpoint log
+def jobKey(p, i, timeLimit):
+    return str(p), str(i), str(timeLimit)
+
+# Heuristic solvers whose stored solutions can warm start the genetic algorithm (the optima of opl and exact would
+# only be given back)
+WARM_START_SOLVERS = ['genetic', 'decomposition']
+
+# Add the tours of the heuristic solvers stored for the point distribution and time limit (see helpersSolutions.py)
+# to the solution cache, unless the instance is already cached
+def warmSolutionCache(p, i, timeLimit, distanceMatrix, cache=solutionCache, store=solutionStore):
+    fingerprint = instanceFingerprint(distanceMatrix)
+    if fingerprint in cache:
+        return
+    tours = [store.get(*key) for key in store.keys()
+             if key[:3] == (int(p), int(i), float(timeLimit)) and key[3] in WARM_START_SOLVERS]
+    if tours:
+        cache.add(fingerprint, tours, [evalTSP(tour, distanceMatrix)[0] for tour in tours])
+
+# Run the genetic algorithm GENETIC_ALGO_LOOPS times on one point distribution with the given time limit,
+# returns the results entry stored in results_genetic.json (None if no solution was found in the time limit).
+# model is 'genetic' (geneticModel) or 'decomposition' (decompositionModel, see decomposition_model.py).
+# The time limit is the budget of the whole job: every loop gets the time left, and the models run in anytime mode
+# (unless modelConfig sets anytime=False), so a solution is returned even with the shortest time limits.
+# With modelConfig warmStart=True the genetic model is warm started from the solution cache, filled with the
+# solutions of the heuristic solvers stored for the same time limit and with the best tour of every loop: results
+# then depend on the previous runs. By default every solve starts from scratch (the cache is only filled)
+def runGeneticJob(p, i, timeLimit, optimalFunValue, modelConfig, pointsDir='./points/', model='genetic'):
+    # load distance matrix (and coordinates) for current file
+    instance = loadInstance(p, i, pointsDir)
+    if model == 'decomposition':
+        solve = decompositionModel
+        config = dict(modelConfig, distanceMatrix=instance['dist'], xTot=instance['xTot'], yTot=instance['yTot'],
+                      timeLimit=timeLimit)
+    else:
+        solve = geneticModel
+        config = dict(modelConfig, distanceMatrix=instance['dist'], xTot=instance['xTot'], yTot=instance['yTot'],
+                      individualSize=p, timeLimit=timeLimit)
+        config.setdefault('cache', solutionCache)
+        config.setdefault('warmStart', False)
+        if config['warmStart']:
+            warmSolutionCache(p, i, timeLimit, instance['dist'], config['cache'])
+    config.setdefault('anytime', True)
+    runStats = {
+        'runs': 0,
+        'runningTimes': [],
+        'objFunValues': [],
+        'solutions': []
+    }
+    deadline = deadlineAfter(timeLimit)
+    # the genetic algorithm is run more than once, to mitigate randomness of results
+    for loop in range(GENETIC_ALGO_LOOPS):
+        print('  Loop #{}'.format(loop+1))
+
+        loopStart = time.perf_counter()
+        config['timeLimit'] = remainingTime(deadline)
+        pop, logb, hof, generationLog = solve(**config)
+
+        # check if any solution was found (otherwise no fit was computed)
+        if generationLog is False:
+            break
+        # update loop stats
+        runStats['runs'] += 1
+        runStats['objFunValues'].append(hof.keys[0].values[0])
+        runStats['solutions'].append(hof.items[0])
+        runStats['runningTimes'].append(time.perf_counter()-loopStart)
+        # check time limit constraint
+        if pastDeadline(deadline):
+            break
+    jobOvershoot = overshoot(deadline)
+
+    if runStats['runs'] == 0:
+        return None
+    # computing both the min and the mean value. In a real application we could keep the minimum value found
+    # but for evaluation purposes lets keep the mean value of the runs of the algorithm
+    meanObjFunValue = round(np.mean(runStats['objFunValues']),13) # round to 13 for comparability with OPL
+    deltaFromOpt = ((meanObjFunValue/optimalFunValue)-1)*100
+
+    # store solution (associated to the min value) in the solution store, starting from the zero hole
+    bestSolutionIndex = runStats['objFunValues'].index(min(runStats['objFunValues']))
+    bestSolution = rotateTour(runStats['solutions'][bestSolutionIndex], loadZeroHoleID(p, i, pointsDir))
+    solutionStore.add(p, i, timeLimit, model, bestSolution)
+
+    return {
+        'runningTime[ms]': float(np.sum(runStats['runningTimes'])*1000),
+        'overshoot[ms]': jobOvershoot*1000,
+        'deltaFromOpt[%]': float(deltaFromOpt),
+        'objFunValue': float(meanObjFunValue),
+        'runs': runStats['runs'],
+        'meanObjFunValue': float(meanObjFunValue)
+    }
+
+# Same as runGeneticJob, returns the job key with the result so that it can be run on a process pool
+def runSweepJob(job):
+    p, i, timeLimit, optimalFunValue, modelConfig, pointsDir = job
+    print('Running optimization for points/{}/{}.dat with time limit {}s'.format(p, i, timeLimit))
+    return jobKey(p, i, timeLimit), runGeneticJob(p, i, timeLimit, optimalFunValue, modelConfig, pointsDir)
+
+# Forked workers inherit the same random state, every worker is seeded again from the OS entropy
+def reseedWorker():
+    random.seed()
+    np.random.seed()
+
+#######################
+### CHECKPOINT LOG ###
+#######################
+# Finished jobs are appended to a json lines log, one line per job, so that a restarted sweep skips them
+def appendCheckpoint(path, key, result):
+    with open(path, 'at') as fout:
+        fout.write(json.dumps({'key': list(key), 'result': result})+'\n')
+        fout.flush()
+        os.fsync(fout.fileno())
+
+def loadCheckpoint(path):
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, 'rt') as fin:
+        for line in fin:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # last line can be truncated if the sweep was killed while writing it
+                continue
+            done[tuple(entry['key'])] = entry['result']
+    return done
+
+# Build the results_genetic.json dictionary (points -> distribution -> time limit) from the finished jobs
+def mergeResults(done, results=None):
+    results = {} if results is None else results
+    for (p, i, timeLimit), result in done.items():
+        if result is None:
+            continue
+        results.setdefault(p, {})
+        results[p].setdefault(i, {})
+        results[p][i][timeLimit] = result
+    return results
@@ -0,0 +1,81 @@
+import math
+import time
+import numpy as np
+from genetic_model import processSession
+from helpersInstances import loadInstance
+
+# Multi-fidelity tuning of the genetic algorithm parameters (successive halving and Hyperband).
+# The budget of an evaluation is a resource r in (0, R]: a configuration evaluated with resource r runs
+# nrGenerations*r/R generations on a share r/R of the instances. Only the best 1/eta of the configurations
+# of a rung is promoted to a budget eta times larger, so most of the compute goes to the good configurations.
+
+# Loss used to compare the configurations, same of 004-hypspace-exploration.py:
+# distance from the OPL optimal solution plus running time relative to the OPL running time
+def customLoss(fitness, geneticTime, OPLsolution):
+    fitness = round(fitness, 13) # round to 13 for comparability with OPL
+    deltaFromOpt = (1-(OPLsolution['objFunValue']/fitness))
+    return 1.2*deltaFromOpt + geneticTime/OPLsolution['runningTime[ms]']
+
+# Random configuration taken from the exploration space (same as hp.choice in 004-hypspace-exploration.py)
+def sampleConfiguration(explorationSpace, rng):
+    return {name: rng.choice(values).item() for name, values in explorationSpace.items()}
+
+# Instances used at a given fidelity: the first share of a fixed random permutation of all the instances,
+# so the instances of a rung always include the ones of the lower rungs
+def budgetInstances(instances, resource, maxResource):
+    nrInstances = max(1, int(round(len(instances)*resource/maxResource)))
+    return instances[:nrInstances]
+
+# Mean loss of one configuration on the given instances, with the number of generations scaled by
+# generationsFraction. Returns the loss and the number of generations actually run (the compute spent)
+def evaluateConfiguration(config, instances, generationsFraction, results, pointsDir='./points/'):
+    losses = []
+    generations = 0
+    for p, i in instances:
+        modelConfig = dict(config, individualSize=p,
+                           nrGenerations=max(1, int(round(config['nrGenerations']*generationsFraction))))
+        startTime = time.time()
+        pop, logb, hof, _ = processSession().solve(loadInstance(p, i, pointsDir), modelConfig, timeLimit=9999)
+        geneticTime = (time.time()-startTime)*1000
+        losses.append(customLoss(hof.keys[0].values[0], geneticTime, results[str(p)][str(i)]['9999']))
+        generations += len(logb)-1
+    return float(np.mean(losses)), generations
+
+# Same as evaluateConfiguration with all the arguments in a tuple, so that it can be run on a process pool
+def evaluateConfigurationJob(args):
+    return evaluateConfiguration(*args)
+
+# Successive halving: evaluates all the configurations with the initial resource, then keeps the best
+# 1/eta of them (at least one) and multiplies the resource by eta, until maxResource is reached.
+# evaluateMany(configs, resource) returns the list of losses of the configurations.
+# Returns the surviving configurations with their loss at the last rung and the history of all the evaluations
+def successiveHalving(configs, resource, maxResource, eta, evaluateMany):
+    history = []
+    while True:
+        losses = evaluateMany(configs, resource)
+        history += [{'config': config, 'resource': resource, 'loss': loss} for config, loss in zip(configs, losses)]
+        if resource >= maxResource*(1-1e-9):
+            break
+        order = np.argsort(losses)[:max(1, len(configs)//eta)]
+        configs = [configs[k] for k in order]
+        resource = min(resource*eta, maxResource)
+    ranked = sorted(zip(configs, losses), key=lambda candidate: candidate[1])
+    return ranked, history
+
+# Hyperband: runs successive halving brackets trading off the number of configurations and their initial budget.
+# Returns the best configuration evaluated with the full budget, its loss and the history of all the evaluations
+def hyperband(maxResource, eta, sample, evaluateMany):
+    sMax = int(math.floor(math.log(maxResource)/math.log(eta) + 1e-9))
+    best, bestLoss, history = None, np.inf, []
+    for s in range(sMax, -1, -1):
+        nrConfigs = int(math.ceil((sMax+1)/(s+1)*eta**s))
+        resource = maxResource/eta**s
+        print('Hyperband bracket {}: {} configurations starting with resource {}'.format(sMax-s+1, nrConfigs, resource))
+        ranked, bracketHistory = successiveHalving([sample() for _ in range(nrConfigs)], resource, maxResource,
+                                                   eta, evaluateMany)
+        history += bracketHistory
+        # only losses computed with the full budget are comparable between brackets
+        for entry in bracketHistory:
+            if entry['resource'] >= maxResource*(1-1e-9) and entry['loss'] < bestLoss:
+                best, bestLoss = entry['config'], entry['loss']
+    return best, bestLoss, history
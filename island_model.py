@@ -0,0 +1,167 @@
+import multiprocessing
+from multiprocessing import shared_memory
+import queue
+import random
+import numpy as np
+from deap import creator, tools
+from genetic_model import geneticModel, processSession
+from helpersGeneticAlgo import deadlineAfter, remainingTime
+from helpersArrayPopulation import ArrayPopulation, ArrayHallOfFame
+from helpersDistance import DistanceBackend
+
+####################
+### ISLAND MODEL ###
+####################
+# K subpopulations (islands) evolve with geneticModel in separate worker processes.
+# Every migrationInterval generations each island sends its best individuals to the islands given by the
+# topology and replaces its worst individuals with the migrants received in the meantime.
+# The distance matrix is copied once in shared memory and read by all the workers without copies.
+
+# Destination islands of the migrants sent by each island
+def migrationTargets(nrIslands, topology):
+    if topology == 'ring':
+        return [[(k+1) % nrIslands] for k in range(nrIslands)]
+    if topology == 'complete':
+        return [[j for j in range(nrIslands) if j != k] for k in range(nrIslands)]
+    raise ValueError('Unknown migration topology: {}'.format(topology))
+
+# Collect the migrants arrived so far, islands never wait for each other
+def receiveMigrants(inbox, nrMigrants):
+    migrants = []
+    while True:
+        try:
+            migrants += inbox.get_nowait()
+        except queue.Empty:
+            break
+    return sorted(migrants, key=lambda migrant: migrant[1])[:nrMigrants]
+
+# Migration callbacks for the list (creator.Individual) and array representations.
+# Migrants are sent as (tour, fitness) pairs
+def listMigration(inbox, outboxes, nrMigrants):
+    def migrate(population):
+        message = [(list(ind), ind.fitness.values[0]) for ind in tools.selBest(population, nrMigrants)]
+        for outbox in outboxes:
+            outbox.put(message)
+        worst = sorted(range(len(population)), key=lambda i: population[i].fitness.values[0], reverse=True)
+        for i, (tour, fitness) in zip(worst, receiveMigrants(inbox, nrMigrants)):
+            ind = creator.Individual(tour)
+            ind.fitness.values = fitness,
+            population[i] = ind
+    return migrate
+
+def arrayMigration(inbox, outboxes, nrMigrants):
+    def migrate(population):
+        best = np.argsort(population.fitness)[:nrMigrants]
+        message = [(population.tours[row].tolist(), population.fitness[row]) for row in best]
+        for outbox in outboxes:
+            outbox.put(message)
+        worst = np.argsort(population.fitness)[::-1]
+        for row, (tour, fitness) in zip(worst, receiveMigrants(inbox, nrMigrants)):
+            population.tours[row] = tour
+            population.fitness[row] = fitness
+            population.valid[row] = True
+    return migrate
+
+# distances is either the name, shape and type of the shared distance matrix or another distance backend
+def islandWorker(islandId, distances, deadline, modelConfig, inbox, outboxes, results,
+                 nrMigrants, migrationInterval, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    # migrants still buffered when the island finishes can be dropped, do not wait for them to be received
+    for outbox in outboxes:
+        outbox.cancel_join_thread()
+    shared = None
+    if isinstance(distances, DistanceBackend):
+        distanceMatrix = distances
+    else:
+        sharedName, shape, dtype = distances
+        shared = shared_memory.SharedMemory(name=sharedName)
+        distanceMatrix = np.ndarray(shape, dtype=dtype, buffer=shared.buf)
+    try:
+        # all the islands share the same deadline, set when the island model was started
+        # (the monotonic clock is system wide, so the deadline is valid in the worker processes)
+        timeLimit = remainingTime(deadline)
+        if modelConfig.get('representation') == 'array':
+            migrate = arrayMigration(inbox, outboxes, nrMigrants)
+        else:
+            migrate = listMigration(inbox, outboxes, nrMigrants)
+        pop, logb, hof, generationLog = geneticModel(timeLimit=timeLimit, distanceMatrix=distanceMatrix, migrate=migrate,
+                                                     migrationInterval=migrationInterval, **modelConfig)
+        if generationLog is False or len(hof) == 0:
+            results.put((islandId, None, None, list(logb)))
+        else:
+            results.put((islandId, list(hof.items[0]), hof.keys[0].values[0], list(logb)))
+        # the numpy view must be released before closing the shared memory
+        del distanceMatrix, pop, hof
+    finally:
+        # the solver session of the process references the distances too
+        processSession().release()
+        if shared is not None:
+            shared.close()
+
+# Run the island model, returns the same values of geneticModel: the best individual of every island as population,
+# the merged logbook (records have an additional island field), the hall of fame and the generation log
+# (False if no island found a solution within the time limit).
+# modelConfig contains the other geneticModel parameters, populationSize is the size of each island.
+def islandModel(timeLimit, distanceMatrix, individualSize, nrIslands=None, migrationInterval=10, nrMigrants=2,
+                topology='ring', seed=None, **modelConfig):
+    nrIslands = nrIslands or multiprocessing.cpu_count()
+    deadline = deadlineAfter(timeLimit)
+    targets = migrationTargets(nrIslands, topology)
+    shared = None
+    if isinstance(distanceMatrix, DistanceBackend):
+        # other distance backends are compact, each worker receives its own copy
+        distances = distanceMatrix
+    else:
+        distanceMatrix = np.ascontiguousarray(distanceMatrix)
+        shared = shared_memory.SharedMemory(create=True, size=max(distanceMatrix.nbytes, 1))
+        sharedMatrix = np.ndarray(distanceMatrix.shape, dtype=distanceMatrix.dtype, buffer=shared.buf)
+        sharedMatrix[:] = distanceMatrix
+        del sharedMatrix
+        distances = (shared.name, distanceMatrix.shape, distanceMatrix.dtype)
+    try:
+        inboxes = [multiprocessing.Queue() for _ in range(nrIslands)]
+        results = multiprocessing.Queue()
+        seeds = np.random.SeedSequence(seed).generate_state(nrIslands)
+        workers = [multiprocessing.Process(target=islandWorker,
+                                           args=(k, distances, deadline,
+                                                 dict(modelConfig, individualSize=individualSize), inboxes[k],
+                                                 [inboxes[j] for j in targets[k]], results, nrMigrants,
+                                                 migrationInterval, int(seeds[k])))
+                   for k in range(nrIslands)]
+        for worker in workers:
+            worker.start()
+        islandResults = []
+        while len(islandResults) < nrIslands:
+            try:
+                islandResults.append(results.get(timeout=1))
+            except queue.Empty:
+                # stop waiting if some worker died without sending its results
+                if not any(worker.is_alive() for worker in workers) and results.empty():
+                    break
+        for worker in workers:
+            worker.join()
+    finally:
+        if shared is not None:
+            shared.close()
+            shared.unlink()
+
+    # merge the logbooks of the islands, ordered by generation
+    logbook = tools.Logbook()
+    logbook.header = ['gen', 'island', 'nevals', 'avg', 'std', 'min', 'max']
+    records = [dict(record, island=k) for k, _, _, islandRecords in islandResults for record in islandRecords]
+    for record in sorted(records, key=lambda record: (record['gen'], record['island'])):
+        logbook.record(**record)
+
+    hof = ArrayHallOfFame(1, individualSize)
+    found = [(tour, fitness) for _, tour, fitness, _ in sorted(islandResults, key=lambda result: result[0])
+             if tour is not None]
+    if not found:
+        return ArrayPopulation(0, individualSize), logbook, hof, False
+    pop = ArrayPopulation(len(found), individualSize)
+    for row, (tour, fitness) in enumerate(found):
+        pop.tours[row] = tour
+        pop.fitness[row] = fitness
+        pop.valid[row] = True
+    hof.update(pop)
+    return pop, logbook, hof, []
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import json
+import time
+
+# Stand-in for oplrun, to check the OPL runner (helpersOpl.py) where OPL is not installed.
+# Called as oplrun: fake-oplrun.py -v -D timeLimit=<s> <model>.mod <data>.dat
+# Builds a nearest neighbor tour from the zero hole of the .dat file, prints the lines parsed by helpersResults.py and
+# writes the flow matrix x to export.txt next to the model file, where OPL writes the output files of hw1.mod.
+# FAKE_OPLRUN_DELAY sets the solving time [s] (default 0.5), FAKE_OPLRUN_MODE simulates the failures:
+# infeasible (exit code 1 as oplrun without a feasible solution), truncated (incomplete export.txt)
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    modelPath = [arg for arg in args if arg.endswith('.mod')][0]
+    datPath = [arg for arg in args if arg.endswith('.dat')][0]
+    delay = float(os.environ.get('FAKE_OPLRUN_DELAY', 0.5))
+    mode = os.environ.get('FAKE_OPLRUN_MODE', 'ok')
+
+    with open(datPath) as fin:
+        dat = fin.read()
+    zeroHoleID = int(re.search(r'zeroHoleID = (\d+);', dat).group(1))
+    distances = json.loads(re.search(r'C = (.*);', dat, re.DOTALL).group(1))
+    size = len(distances)
+
+    start = time.time()
+    time.sleep(delay)
+    if mode == 'infeasible':
+        sys.stderr.write('No feasible solution found\n')
+        sys.exit(1)
+
+    tour = [zeroHoleID-1]
+    while len(tour) < size:
+        last = distances[tour[-1]]
+        tour.append(min((b for b in range(size) if b not in tour), key=lambda b: last[b]))
+    objective = sum(distances[tour[k-1]][tour[k]] for k in range(size))
+    flow = [[0]*size for _ in range(size)]
+    for k in range(size):
+        flow[tour[k-1]][tour[k]] = size-k if k > 0 else size
+
+    rows = ' '.join('[{}]'.format(' '.join(str(value) for value in row)) for row in flow)
+    export = '[{}]\n'.format(rows)
+    if mode == 'truncated':
+        export = export[:len(export)//2]
+    with open(os.path.join(os.path.dirname(os.path.abspath(modelPath)), 'export.txt'), 'wt') as fout:
+        fout.write(export)
+    print('// solution (optimal) with objective {}'.format(objective))
+    print('solving time ~= {}'.format((time.time()-start)*1000))